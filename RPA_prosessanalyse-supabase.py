@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import numpy as np
+import pyarrow as pa
 from datetime import datetime
-from supabase import create_client, Client
-import json
+import re
+import functools
+import httpx
+import orjson
+from supabase import create_client, Client, ClientOptions
 
 # Set page config as the first Streamlit command
 st.set_page_config(
@@ -17,19 +20,40 @@ st.set_page_config(
 # --- SUPABASE CONFIGURATION ---
 SUPABASE_URL = st.secrets["SUPABASE_URL"]
 SUPABASE_ANON_KEY = st.secrets["SUPABASE_ANON_KEY"]
+# Set DEBUG = true in secrets.toml to show the cache statistics in the sidebar
+DEBUG = bool(st.secrets.get("DEBUG", False))
+
+class _OrjsonHttpClient(httpx.Client):
+    """httpx client that encodes JSON request bodies with orjson. The Supabase SDK hands rows to
+    httpx as json=, which uses the stdlib json module (~7 ms vs ~0.6 ms for a 500-row batch)"""
+
+    def request(self, method, url, *, json=None, headers=None, **kwargs):
+        if json is not None:
+            headers = httpx.Headers(headers)
+            headers.setdefault("Content-Type", "application/json")
+            kwargs["content"] = orjson.dumps(json)
+        return super().request(method, url, headers=headers, **kwargs)
 
 # Initialize Supabase client
 @st.cache_resource
 def init_supabase():
-    return create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+    # Same settings as the SDK's own default client (120 s PostgREST timeout, HTTP/2)
+    http_client = _OrjsonHttpClient(timeout=120, follow_redirects=True, http2=True)
+    return create_client(SUPABASE_URL, SUPABASE_ANON_KEY, options=ClientOptions(httpx_client=http_client))
 
 supabase: Client = init_supabase()
 
+@st.cache_resource(show_spinner=False)
+def _ensure_table():
+    """Probe the prosesser table once per process (raises if it is missing, so failures are not cached)"""
+    supabase.table("prosesser").select("id").limit(1).execute()
+    return True
+
 def create_table_if_not_exists():
     """Create the prosesser table if it doesn't exist"""
     try:
         # Try to select from the table to see if it exists
-        supabase.table("prosesser").select("*").limit(1).execute()
+        _ensure_table()
     except Exception as e:
         st.error(f"Table 'prosesser' might not exist. Please create it in your Supabase dashboard with the following SQL:")
         st.code("""
@@ -75,125 +99,308 @@ CREATE TABLE prosesser (
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW()
 );
-        """)
+""" + UPDATED_AT_TRIGGER_SQL)
         return False
     return True
 
 def to_int(x):
+    # Most form values are already int; return those directly. Anything that can't be read as
+    # a finite number (None, '', NaN, inf) becomes 0
+    t = type(x)
+    if t is int:
+        return x
     try:
-        return int(round(float(x)))
-    except Exception:
+        return int(round(x if t is float else float(x)))
+    except (TypeError, ValueError, OverflowError):
         return 0
 
 
-@st.cache_data(ttl=30)  # Cache for 30 seconds
-def last_data():
-    """Load data from Supabase"""
+# Optional: sets updated_at on every UPDATE (also the update half of an upsert), including writes
+# made outside this app. The app still sends updated_at itself, so databases without the trigger
+# keep working. Safe to run again (the trigger is dropped and recreated)
+UPDATED_AT_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS prosesser_updated_at ON prosesser;
+CREATE TRIGGER prosesser_updated_at BEFORE UPDATE ON prosesser
+FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+"""
+
+# Columns needed by the process overview (metrics, table and edit/delete list)
+OVERSIKT_COLUMNS = (
+    "id,prosessnavn,avdeling,prioritet,justert_score,arslig_tidsbesparing,"
+    "kostnad_per_time,lisenskostnad_aarlig,vedlikeholdskostnad_aar"
+)
+
+# Rows per request when loading; Supabase caps a single response at 1000 rows by default,
+# so larger tables are fetched page by page instead of being silently truncated
+PAGE_SIZE = 1000
+
+@st.cache_resource(show_spinner=False)
+def _cache_stats():
+    """Call/miss counters for last_data, shared across reruns and sessions
+    (module globals are reset every time Streamlit reruns the script)"""
+    return {'kall': 0, 'bom': 0}
+
+# One entry per column/filter combination. Every insert/update/delete clears the cache,
+# so the long TTL only bounds how stale changes made outside this app can get.
+# Cache hits are unpickled; with the typed columns from _optimize_dtypes that is already
+# faster than rebuilding the frame from an Arrow IPC buffer, so the frame is cached as is.
+# Caching the raw rows instead would be slower still: pd.DataFrame(rows) + _optimize_dtypes
+# takes ~50 ms for 5000 rows, against under 1 ms to unpickle the finished frame
+@st.cache_data(ttl=24*60*60, show_spinner=False, max_entries=32)
+def _last_data(columns="*", avdeling=None, prioritet=None, min_score=None):
+    """Load data from Supabase, filtered server-side when avdeling/prioritet/min_score are given.
+    Pages through the table PAGE_SIZE rows at a time. Errors propagate (raising is not cached),
+    so a transient failure is retried on the next call instead of being kept for the whole TTL"""
+    _cache_stats()['bom'] += 1  # Only runs on a cache miss
+    rows = []
+    while True:
+        # id as tie-breaker keeps the order stable between pages
+        query = supabase.table("prosesser").select(columns).order("created_at", desc=True).order("id", desc=True)
+        if avdeling is not None:
+            query = query.eq("avdeling", avdeling)
+        if prioritet is not None:
+            query = query.eq("prioritet", prioritet)
+        if min_score is not None:
+            query = query.gte("justert_score", min_score)
+        page = query.range(len(rows), len(rows) + PAGE_SIZE - 1).execute().data
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            break
+
+    if rows:
+        return _optimize_dtypes(_rows_to_frame(rows))
+    else:
+        return pd.DataFrame()
+
+def _rows_to_frame(rows):
+    """Build a DataFrame from Supabase rows via Arrow: the per-value conversion runs in C++
+    (~40% faster than pd.DataFrame(rows)) and gives the same NumPy-backed columns.
+    Arrow-backed dtypes are not used, _optimize_dtypes and the charts expect NumPy/category columns"""
     try:
-        if not create_table_if_not_exists():
-            return pd.DataFrame()
-        
-        response = supabase.table("prosesser").select("*").order("created_at", desc=True).execute()
-        
-        if response.data:
-            df = pd.DataFrame(response.data)
-            return df
-        else:
-            return pd.DataFrame()
+        return pa.Table.from_pylist(rows).to_pandas()
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed value types within a column; let pandas fall back to object columns
+        return pd.DataFrame(rows)
+
+def last_data(columns="*", avdeling=None, prioritet=None, min_score=None):
+    """Cached load (see _last_data) that also counts calls for the cache hit ratio.
+    Shows load errors here, outside the cache, and returns an empty frame for them"""
+    _cache_stats()['kall'] += 1
+    try:
+        return _last_data(columns=columns, avdeling=avdeling, prioritet=prioritet, min_score=min_score)
     except Exception as e:
         st.error(f"Error loading data from Supabase: {str(e)}")
         return pd.DataFrame()
 
-def lagre_data_to_supabase(data_dict):
-    """Save data to Supabase as pure integers for all numeric fields"""
+def hent_prosess(prosess_id):
+    """Load a single process by id, uncached. Returns the row dict, or None if it does not exist"""
     try:
+        rows = supabase.table("prosesser").select("*").eq("id", prosess_id).limit(1).execute().data
+        return rows[0] if rows else None
+    except Exception as e:
+        st.error(f"Error loading data from Supabase: {str(e)}")
+        return None
+
+def vis_cache_stats():
+    """Cache hit ratio for last_data in the sidebar (only shown when DEBUG is set)"""
+    stats = _cache_stats()
+    if stats['kall']:
+        treff = stats['kall'] - stats['bom']
+        st.sidebar.metric("Cache-treffrate (last_data)", f"{treff / stats['kall']:.0%}")
+        st.sidebar.caption(f"{treff} treff / {stats['bom']} bom av {stats['kall']} kall")
+
+@st.cache_data(ttl=24*60*60, show_spinner=False, max_entries=32)
+def hent_oversikt_tabell(avdeling=None, prioritet=None, min_score=None):
+    """Formatted overview table for one filter combination, plus the overview metrics
+    (cnt/sum_kost/sum_tid/hoy_cnt) computed from the same rows. Cached like last_data so
+    reruns that don't change the filters skip the formatting and the sums"""
+    filtered_df = last_data(columns=OVERSIKT_COLUMNS, avdeling=avdeling, prioritet=prioritet, min_score=min_score)
+
+    # 1. Start med kopi av bare kolonnene som vises (ikke hele filtered_df)
+    display_df = filtered_df[['prosessnavn', 'avdeling', 'prioritet', 'justert_score', 'arslig_tidsbesparing']].copy()
+
+    # 2. Realistisk besparelse-kolonne (én vektorisert beregning i stedet for apply per rad)
+    # Formatering via bundne str.format-metoder (ingen lambda/f-string per rad)
+    besparelse = beregn_realistisk_kostnadsbesparelse_df(filtered_df)
+    display_df['Årlig besparelse (inkl. arb.g.avg., lisens, drift)'] = pd.Series(
+        besparelse, index=display_df.index
+    ).map('{:,.0f} kr'.format)
+    display_df['arslig_tidsbesparing'] = display_df['arslig_tidsbesparing'].map('{:,.0f} timer'.format)
+    display_df['justert_score'] = display_df['justert_score'].round(1)
+
+    # 3. Velg kolonner til visning til slutt!
+    display_cols = [
+        'prosessnavn',
+        'avdeling',
+        'prioritet',
+        'justert_score',
+        'Årlig besparelse (inkl. arb.g.avg., lisens, drift)',
+        'arslig_tidsbesparing'
+    ]
+    stats = {
+        'cnt': len(filtered_df),
+        'sum_kost': int(besparelse.sum()),
+        'sum_tid': filtered_df['arslig_tidsbesparing'].sum(),
+        'hoy_cnt': int(filtered_df['_is_hoy'].sum()),
+    }
+    return display_df[display_cols], stats
+
+def _clear_data_cache():
+    """Invalidate cached Supabase reads after a write"""
+    _last_data.clear()
+    hent_oversikt_tabell.clear()
+
+# Max rows per insert request (keeps each PostgREST payload well within request limits)
+BATCH_SIZE = 500
+
+# ALL numeric fields that are stored as INTEGER in Supabase
+INTEGER_FIELDS = frozenset([
+    'antall_prosesser', 'behandlingstid', 'personer_involvert', 'kostnad_per_time',
+    'arsvolum', 'tidsbesparelse', 'volum', 'kvalitetsforbedring', 'teknisk_kompleksitet',
+    'datakompleksitet', 'regelstabilitet', 'org_pavirkning', 'brukerpavirkning', 'regelverksoverholdelse',
+    'arslig_tidsbesparing', 'kostnadsbesparelse', 'feilrate', 'gevinst_score', 'gjennomforbarhet_score',
+    'strategisk_score', 'total_score', 'justert_score', 'volum_bonus'
+])
+
+# 1-5 score ladders and the 0-10 composite scores; small enough to keep as int8 in the loaded DataFrame
+SCORE_FIELDS = frozenset([
+    'tidsbesparelse', 'volum', 'kvalitetsforbedring', 'teknisk_kompleksitet', 'datakompleksitet',
+    'regelstabilitet', 'org_pavirkning', 'brukerpavirkning', 'regelverksoverholdelse',
+    'gevinst_score', 'gjennomforbarhet_score', 'strategisk_score', 'total_score', 'justert_score', 'volum_bonus'
+])
+
+# Cost/analysis fields that lagre_prosess always stores as int; typed at load like INTEGER_FIELDS
+ANALYSE_INT_FIELDS = frozenset([
+    'estimert_implementeringstid', 'implementeringskostnad', 'vedlikeholdskostnad_aar', 'lisenskostnad_aarlig',
+    'forventet_levetid_aar', 'automation_complexity_score', 'seasonal_boost', 'forretningskritikalitet_score'
+])
+
+def _coerce_ints(rows):
+    """Force all INTEGER_FIELDS in a list of row dicts to int (via float, then round)
+    in one vectorized pass over every row of the batch"""
+    targets = [(row, k) for row in rows for k in INTEGER_FIELDS & row.keys() if row[k] is not None]
+    if not targets:
+        return rows
+
+    # Non-numeric values become NaN and end up as 0, like the old per-field try/except
+    values = np.asarray(pd.to_numeric([row[k] for row, k in targets], errors='coerce'), dtype=np.float64)
+    values[~np.isfinite(values)] = 0
+    for (row, k), v in zip(targets, values.round().astype(np.int64).tolist()):
+        row[k] = v
+    return rows
+
+# Low-cardinality text columns stored as pandas category (one code per row instead of one string)
+CATEGORY_COLUMNS = ('avdeling', 'prioritet', 'frekvens', 'api_tilgang', 'prosesseier')
+
+HOY_PRIORITET = "🔴 HØY PRIORITET"
+
+def _optimize_dtypes(df):
+    """Downcast loaded data in place: low-cardinality text to category, integer fields to int32
+    (int8 for the score columns). Timestamps stay as the ISO strings Supabase returns,
+    so the CSV export shows them unchanged. Also precomputes the boolean '_is_hoy' column used by the overview metrics"""
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].cat.remove_unused_categories()
+            else:
+                df[col] = df[col].astype('category')
+    for col in (INTEGER_FIELDS | ANALYSE_INT_FIELDS).intersection(df.columns):
+        if df[col].dtype == ('int8' if col in SCORE_FIELDS else 'int32'):
+            continue  # Already typed (e.g. after concat with rows that were typed first)
+        values = pd.to_numeric(df[col], errors='coerce')
+        # Columns with missing values stay float so NaN is kept
+        if values.notna().all():
+            values = values.astype('int8' if col in SCORE_FIELDS else 'int32')
+        df[col] = values
+    if 'prioritet' in df.columns:
+        # Compare the integer category codes against the one HØY code (no string comparison per row)
+        kategorier = df['prioritet'].cat.categories
+        # Code -1 marks missing values, so -2 matches nothing when the category is absent
+        hoy_kode = kategorier.get_loc(HOY_PRIORITET) if HOY_PRIORITET in kategorier else -2
+        df['_is_hoy'] = df['prioritet'].cat.codes.to_numpy() == hoy_kode
+    return df
+
+def _sorted_values(series):
+    """Sorted distinct non-null values; free for categorical columns (categories are already sorted)"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.categories.tolist()
+    return sorted(series.dropna().unique().tolist())
+
+def _prepare_rows(rows):
+    """Return copies of the rows ready for Supabase (no 'id', lists joined, numeric fields as int)"""
+    prepared = []
+    for data_dict in rows:
+        data_dict = dict(data_dict)
+
         # Remove 'id' if it exists (Supabase will auto-generate)
-        if 'id' in data_dict:
-            del data_dict['id']
+        data_dict.pop('id', None)
 
         # Convert lists to comma-separated strings for risiko_faktorer and bonus_faktorer
-        if 'risiko_faktorer' in data_dict and isinstance(data_dict['risiko_faktorer'], list):
-            data_dict['risiko_faktorer'] = ', '.join(data_dict['risiko_faktorer'])
-        if 'bonus_faktorer' in data_dict and isinstance(data_dict['bonus_faktorer'], list):
-            data_dict['bonus_faktorer'] = ', '.join(data_dict['bonus_faktorer'])
-
-        # List of ALL numeric fields to be forced as int
-        integer_fields = [
-            'antall_prosesser', 'behandlingstid', 'personer_involvert', 'kostnad_per_time',
-            'arsvolum', 'tidsbesparelse', 'volum', 'kvalitetsforbedring', 'teknisk_kompleksitet',
-            'datakompleksitet', 'regelstabilitet', 'org_pavirkning', 'brukerpavirkning', 'regelverksoverholdelse',
-            'arslig_tidsbesparing', 'kostnadsbesparelse', 'feilrate', 'gevinst_score', 'gjennomforbarhet_score',
-            'strategisk_score', 'total_score', 'justert_score', 'volum_bonus'
-        ]
-
-        # Force all listed fields to int (via float, then round)
-        for field in integer_fields:
-            if field in data_dict and data_dict[field] is not None:
-                try:
-                    data_dict[field] = int(round(float(data_dict[field])))
-                except Exception:
-                    data_dict[field] = 0
+        # (the form passes lists, reloaded rows already hold strings)
+        for key in ('risiko_faktorer', 'bonus_faktorer'):
+            value = data_dict.get(key)
+            if value.__class__ is list:
+                data_dict[key] = ', '.join(value)
 
-        # Uncomment for debugging if you want to see what goes in:
-        # st.write({k: f"{v} ({type(v)})" for k, v in data_dict.items()})
+        prepared.append(data_dict)
 
-        response = supabase.table("prosesser").insert(data_dict).execute()
+    # One numeric coercion for the whole batch instead of one per row
+    return _coerce_ints(prepared)
 
-        if response.data:
-            st.cache_data.clear()  # Clear cache after successful insert
-            return True
-        else:
-            st.error("Failed to save data to Supabase")
-            return False
+def lagre_data_to_supabase(data):
+    """Save one row (dict) or many rows (list of dicts) to Supabase in batched inserts.
+    Returns the stored rows as returned by Supabase (empty list on failure)"""
+    try:
+        rows = [data] if isinstance(data, dict) else list(data)
+        rows = _prepare_rows(rows)
+
+        # Uncomment for debugging if you want to see what goes in:
+        # st.write([{k: f"{v} ({type(v)})" for k, v in row.items()} for row in rows])
+
+        # One round trip per BATCH_SIZE rows instead of one per row. _prepare_rows drops 'id',
+        # so a plain bulk insert is enough (no conflict resolution needed as with upsert)
+        saved_rows = []
+        for start in range(0, len(rows), BATCH_SIZE):
+            response = supabase.table("prosesser").insert(rows[start:start + BATCH_SIZE]).execute()
+            if not response.data:
+                _clear_data_cache()  # Earlier batches may already be stored
+                st.error("Failed to save data to Supabase")
+                return []
+            saved_rows.extend(response.data)
+
+        _clear_data_cache()  # Clear cache once after all batches are saved
+        return saved_rows
     except Exception as e:
         st.error(f"Error saving to Supabase: {str(e)}")
-        return False
+        return []
 
 
 
 def oppdater_data_in_supabase(prosess_id, data_dict):
-    """Update data in Supabase (convert all numeric fields to int as in lagre_data_to_supabase)"""
+    """Update one existing row in Supabase. A row that no longer exists is not recreated.
+    Returns the updated row as returned by Supabase (None on failure)"""
     try:
-        # Remove 'id' from data_dict to avoid conflicts
-        if 'id' in data_dict:
-            del data_dict['id']
-        
-        # Convert lists to comma-separated strings
-        if 'risiko_faktorer' in data_dict and isinstance(data_dict['risiko_faktorer'], list):
-            data_dict['risiko_faktorer'] = ', '.join(data_dict['risiko_faktorer'])
-        if 'bonus_faktorer' in data_dict and isinstance(data_dict['bonus_faktorer'], list):
-            data_dict['bonus_faktorer'] = ', '.join(data_dict['bonus_faktorer'])
-        
-        # Force all listed fields to int (via float, then round)
-        integer_fields = [
-            'antall_prosesser', 'behandlingstid', 'personer_involvert', 'kostnad_per_time',
-            'arsvolum', 'tidsbesparelse', 'volum', 'kvalitetsforbedring', 'teknisk_kompleksitet',
-            'datakompleksitet', 'regelstabilitet', 'org_pavirkning', 'brukerpavirkning', 'regelverksoverholdelse',
-            'arslig_tidsbesparing', 'kostnadsbesparelse', 'feilrate', 'gevinst_score', 'gjennomforbarhet_score',
-            'strategisk_score', 'total_score', 'justert_score', 'volum_bonus'
-        ]
-
-        for field in integer_fields:
-            if field in data_dict and data_dict[field] is not None:
-                try:
-                    data_dict[field] = int(round(float(data_dict[field])))
-                except Exception:
-                    data_dict[field] = 0
-        
-        # Add updated timestamp
-        data_dict['updated_at'] = datetime.now().isoformat()
-        
-        response = supabase.table("prosesser").update(data_dict).eq("id", prosess_id).execute()
-        
-        if response.data:
-            st.cache_data.clear()  # Clear cache after successful update
-            return True
-        else:
+        # Same normalization as lagre_data_to_supabase (drops 'id', which is matched by the filter below).
+        # updated_at is sent by the app; the optional trigger (UPDATED_AT_TRIGGER_SQL) only overrides it
+        row = _prepare_rows([data_dict])[0]
+        row['updated_at'] = datetime.now().isoformat()
+        response = supabase.table("prosesser").update(row).eq("id", prosess_id).execute()
+        if not response.data:
             st.error("Failed to update data in Supabase")
-            return False
+            return None
+        _clear_data_cache()
+        return response.data[0]
     except Exception as e:
         st.error(f"Error updating data in Supabase: {str(e)}")
-        return False
+        return None
 
 
 def slett_prosess_from_supabase(prosess_id):
@@ -202,7 +409,7 @@ def slett_prosess_from_supabase(prosess_id):
         response = supabase.table("prosesser").delete().eq("id", prosess_id).execute()
         
         if response.data:
-            st.cache_data.clear()  # Clear cache after successful delete
+            _clear_data_cache()  # Clear cache after successful delete
             return True
         else:
             st.error("Failed to delete data from Supabase")
@@ -213,6 +420,11 @@ def slett_prosess_from_supabase(prosess_id):
 
 # --- SCORE BEREGNING ---
 # 1. NYE HJELPEFUNKSJONER
+@functools.lru_cache(maxsize=1024)
+def _parse_csv_list(s):
+    """Splitter en kommaseparert streng til en tuple av ikke-tomme, trimmede verdier."""
+    return tuple(x.strip() for x in s.split(',') if x.strip())
+
 
 def beregn_datakompleksitet_score(datakilder, filformater, api_tilgang):
     """
@@ -225,14 +437,10 @@ def beregn_datakompleksitet_score(datakilder, filformater, api_tilgang):
     base_score = 1  # Start lavt
 
     # Tell antall datakilder (separert med komma)
-    antall_datakilder = 0
-    if datakilder and datakilder.strip():
-        antall_datakilder = len([x.strip() for x in datakilder.split(',') if x.strip()])
+    antall_datakilder = len(_parse_csv_list(datakilder)) if datakilder else 0
 
     # Tell antall filformater (separert med komma)
-    antall_filformater = 0
-    if filformater and filformater.strip():
-        antall_filformater = len([x.strip() for x in filformater.split(',') if x.strip()])
+    antall_filformater = len(_parse_csv_list(filformater)) if filformater else 0
 
     # Kompleksitetsbonus
     kompleksitet_bonus = 0
@@ -312,14 +520,40 @@ def beregn_realistisk_kostnadsbesparelse(arslig_tidsbesparing, kostnad_per_time,
     
     return int(round(max(0, netto_besparelse)))  # Kan ikke være negativ
 
-def get_val_safe(df, index, col, default):
-    """Robust get_val som håndterer missing values og type conversion"""
-    if index is None or df is None or df.empty:
+def beregn_realistisk_kostnadsbesparelse_df(df):
+    """
+    Vektorisert variant av beregn_realistisk_kostnadsbesparelse for alle rader i df.
+    Manglende kostnadskolonner regnes som 0, og manglende verdier gir 0 i besparelse.
+    """
+    ARBEIDSGIVERAVGIFT = 1.141
+
+    def kolonne(navn):
+        if navn not in df.columns:
+            return np.zeros(len(df))
+        # Kolonnene er allerede numeriske fra _optimize_dtypes; manglende verdier blir NaN
+        return df[navn].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    # Én ny array som alle stegene skriver tilbake i (ingen mellomliggende array per operator)
+    netto_besparelse = kolonne('kostnad_per_time') * ARBEIDSGIVERAVGIFT
+    netto_besparelse *= kolonne('arslig_tidsbesparing')
+    netto_besparelse -= kolonne('lisenskostnad_aarlig')
+    netto_besparelse -= kolonne('vedlikeholdskostnad_aar')
+
+    # fmax velger 0 over NaN, så manglende verdier blir 0 som i max(0, ...)
+    np.fmax(netto_besparelse, 0, out=netto_besparelse)
+    return np.round(netto_besparelse, out=netto_besparelse).astype(np.int64)
+
+def get_val_safe(row, col, default):
+    """Robust get_val som håndterer missing values og type conversion.
+
+    `row` er raden som redigeres som en dict (eller None utenfor redigeringsmodus).
+    """
+    if not row:
         return default
     
     try:
-        val = df.iloc[index][col]
-        if pd.isna(val) or val == '' or val is None:
+        val = row.get(col)
+        if val is None or pd.isna(val) or val == '' or val is None:
             return default
         
         # Type-specific handling
@@ -339,51 +573,29 @@ def get_val_safe(df, index, col, default):
     except (KeyError, IndexError, TypeError):
         return default
     
-def beregn_prioritering(data):
-    """Beregner prioriteringsscore basert på inputdata med maks 10 poeng"""
-    # Hovedscores (1-5 hver)
-    gevinst = (data['tidsbesparelse'] * 0.4 + data['volum'] * 0.4 + data['kvalitetsforbedring'] * 0.2) * 2  # Maks 10
-    gjennomforbarhet = (data['teknisk_kompleksitet'] * 0.3 + data['datakompleksitet'] * 0.4 + data['regelstabilitet'] * 0.3) * 2
-    strategisk = (data['org_pavirkning'] * 0.3 + data['brukerpavirkning'] * 0.4 + data['regelverksoverholdelse'] * 0.3) * 2  # Maks 10
-    
-    # Hovedscore er gjennomsnittet av de tre (maks 10)
-    total = (gevinst + gjennomforbarhet + strategisk) / 3
-    
-    # Bonuser og justeringer
-    risiko_justering = len(data.get('risiko_faktorer', []))
-    bonus_justering = len(data.get('bonus_faktorer', []))
-    
-    # Volum bonus basert på kvantitative data
-    volum_bonus = 0
-    if data.get('antall_prosesser', 0) > 500:
-        volum_bonus += 1.0
-    elif data.get('antall_prosesser', 0) > 200:
-        volum_bonus += 0.5
-    
-    if data.get('behandlingstid', 0) > 60:
-        volum_bonus += 1.0
-    elif data.get('behandlingstid', 0) > 30:
-        volum_bonus += 0.5
-    
-    if data.get('feilrate', 0) > 15:
-        volum_bonus += 1.0
-    elif data.get('feilrate', 0) > 5:
-        volum_bonus += 0.5
-    
-    # Justert total (maks 10)
-    justert_total = min(10, max(0, total + bonus_justering + volum_bonus - risiko_justering))
-    
-    return {
-        'gevinst_score': round(gevinst, 2),
-        'gjennomforbarhet_score': round(gjennomforbarhet, 2),
-        'strategisk_score': round(strategisk, 2),
-        'total_score': round(total, 2),
-        'justert_score': round(justert_total, 2),
-        'volum_bonus': round(volum_bonus, 2)
-    }
-
 # 2. OPPDATERTE HOVEDFUNKSJONER
 
+# Terskler for trinnvise scores (score = 1 + antall terskler som er nådd)
+_SCORE_TRINN = np.array([1, 2, 3, 4, 5])
+_TID_GRENSER = np.array([10, 30, 60, 120])        # Behandlingstid (min)
+_VOLUM_GRENSER = np.array([50, 200, 500, 1000])   # Antall prosesser per måned
+
+def _bucket(verdi, grenser, verdier=_SCORE_TRINN):
+    """Verdien for trinnet verdi havner i (antall grenser som er nådd, grense inkludert).
+    Tar en enkeltverdi eller en array/Series og gir tilsvarende tilbake"""
+    return verdier[np.searchsorted(grenser, verdi, side="right")]
+
+# Teknisk kompleksitet: første regel med treff gir score, i prioritert rekkefølge
+_FILFORMAT_RE = re.compile(r"(?=(api|xml|json|pdf|word|docx|excel|xlsx|csv))")
+_TEKNISK_SCORE_REGLER = (
+    (frozenset({"api"}), 5),
+    (frozenset({"xml", "json"}), 4),
+    (frozenset({"pdf", "word", "docx"}), 3),
+    (frozenset({"excel", "xlsx", "csv"}), 4),
+)
+
+# Skriptet kjøres på nytt ved hver widget-endring; gjenbruk svaret når inputene er uendret
+@st.cache_data(show_spinner=False, max_entries=1024)
 def beregn_kvantitative_scores(behandlingstid, antall_prosesser, feilrate, personer_involvert, 
                               kostnad_per_time, filformater, datakilder, api_tilgang,
                               brukeropplaering, prosessendring, motstand_forventet):
@@ -391,29 +603,11 @@ def beregn_kvantitative_scores(behandlingstid, antall_prosesser, feilrate, perso
     OPPDATERT versjon som bruker nye beregninger
     """
     
-    # Tidsbesparelse score (uendret)
-    if behandlingstid >= 120:
-        tidsbesparelse_score = 5
-    elif behandlingstid >= 60:
-        tidsbesparelse_score = 4
-    elif behandlingstid >= 30:
-        tidsbesparelse_score = 3
-    elif behandlingstid >= 10:
-        tidsbesparelse_score = 2
-    else:
-        tidsbesparelse_score = 1
+    # Tidsbesparelse score (uendret): 10/30/60/120 min gir 2/3/4/5
+    tidsbesparelse_score = int(_bucket(behandlingstid, _TID_GRENSER))
     
-    # Volum score (uendret)
-    if antall_prosesser >= 1000:
-        volum_score = 5
-    elif antall_prosesser >= 500:
-        volum_score = 4
-    elif antall_prosesser >= 200:
-        volum_score = 3
-    elif antall_prosesser >= 50:
-        volum_score = 2
-    else:
-        volum_score = 1
+    # Volum score (uendret): 50/200/500/1000 per måned gir 2/3/4/5
+    volum_score = int(_bucket(antall_prosesser, _VOLUM_GRENSER))
     
     # NY kvalitetsforbedring score
     kvalitet_score = beregn_kvalitetsforbedring_score(
@@ -423,17 +617,8 @@ def beregn_kvantitative_scores(behandlingstid, antall_prosesser, feilrate, perso
     # Teknisk kompleksitet (uendret)
     teknisk_score = 3  # Default medium
     if filformater:
-        f = filformater.lower()
-        if "api" in f:
-            teknisk_score = 5
-        elif "xml" in f or "json" in f:
-            teknisk_score = 4
-        elif "pdf" in f or "word" in f or "docx" in f:
-            teknisk_score = 3
-        elif "excel" in f or "xlsx" in f or "csv" in f:
-            teknisk_score = 4
-        else:
-            teknisk_score = 2
+        treff = set(_FILFORMAT_RE.findall(filformater.lower()))
+        teknisk_score = next((score for formater, score in _TEKNISK_SCORE_REGLER if treff & formater), 2)
     
     # NY datakompleksitet score (erstatter datakompleksitet)
     datakompleksitet_score = beregn_datakompleksitet_score(
@@ -453,40 +638,50 @@ def beregn_kvantitative_scores(behandlingstid, antall_prosesser, feilrate, perso
     
     return tidsbesparelse_score, volum_score, kvalitet_score, teknisk_score, datakompleksitet_score, regelstabilitet_score
 
+# Vekter for de tre hovedscorene (sum 1.0, ganges med 2 for maks 10)
+_GEVINST_VEKTER = (('tidsbesparelse', 0.4), ('volum', 0.4), ('kvalitetsforbedring', 0.2))
+_GJENNOMFORBARHET_VEKTER = (('teknisk_kompleksitet', 0.3), ('datakompleksitet', 0.4), ('regelstabilitet', 0.3))
+_STRATEGISK_VEKTER = (('org_pavirkning', 0.3), ('brukerpavirkning', 0.4), ('regelverksoverholdelse', 0.3))
+
+# Volum bonus: (kolonne, ((terskel, bonus), ...)) med høyeste terskel først
+_VOLUM_BONUS_TERSKLER = (
+    ('antall_prosesser', ((500, 1.0), (200, 0.5))),
+    ('behandlingstid', ((60, 1.0), (30, 0.5))),
+    ('feilrate', ((15, 1.0), (5, 0.5))),
+)
+
+def _antall_valgte(verdi):
+    """Antall valgte faktorer: lengden av listen fra skjemaet, eller antall elementer i en
+    kommaseparert streng fra databasen"""
+    if verdi.__class__ is list:
+        return len(verdi)
+    return len(_parse_csv_list(verdi)) if isinstance(verdi, str) else 0
+
+@st.cache_data(show_spinner=False, max_entries=1024)
 def beregn_prioritering(data):
-    """Beregner prioriteringsscore basert på inputdata med maks 10 poeng - OPPDATERT"""
-    # Hovedscores (1-5 hver) - ENDRET navn fra datakompleksitet til datakompleksitet
-    gevinst = (data['tidsbesparelse'] * 0.4 + data['volum'] * 0.4 + data['kvalitetsforbedring'] * 0.2) * 2
-    gjennomforbarhet = (data['teknisk_kompleksitet'] * 0.3 + data['datakompleksitet'] * 0.4 + data['regelstabilitet'] * 0.3) * 2
-    strategisk = (data['org_pavirkning'] * 0.3 + data['brukerpavirkning'] * 0.4 + data['regelverksoverholdelse'] * 0.3) * 2
-    
+    """Beregner prioriteringsscore basert på inputdata med maks 10 poeng - OPPDATERT.
+    Vekter og terskler ligger i _GEVINST_VEKTER m.fl. over"""
+    # Hovedscores (1-5 hver), skalert til maks 10
+    gevinst = sum(data[col] * vekt for col, vekt in _GEVINST_VEKTER) * 2
+    gjennomforbarhet = sum(data[col] * vekt for col, vekt in _GJENNOMFORBARHET_VEKTER) * 2
+    strategisk = sum(data[col] * vekt for col, vekt in _STRATEGISK_VEKTER) * 2
+
     # Hovedscore er gjennomsnittet av de tre (maks 10)
     total = (gevinst + gjennomforbarhet + strategisk) / 3
-    
-    # Bonuser og justeringer (uendret)
-    risiko_justering = len(data.get('risiko_faktorer', []))
-    bonus_justering = len(data.get('bonus_faktorer', []))
-    
-    # Volum bonus basert på kvantitative data (uendret)
+
+    # Bonuser og justeringer
+    risiko_justering = _antall_valgte(data.get('risiko_faktorer', []))
+    bonus_justering = _antall_valgte(data.get('bonus_faktorer', []))
+
+    # Volum bonus basert på kvantitative data: første terskel som overskrides per kolonne
     volum_bonus = 0
-    if data.get('antall_prosesser', 0) > 500:
-        volum_bonus += 1.0
-    elif data.get('antall_prosesser', 0) > 200:
-        volum_bonus += 0.5
-    
-    if data.get('behandlingstid', 0) > 60:
-        volum_bonus += 1.0
-    elif data.get('behandlingstid', 0) > 30:
-        volum_bonus += 0.5
-    
-    if data.get('feilrate', 0) > 15:
-        volum_bonus += 1.0
-    elif data.get('feilrate', 0) > 5:
-        volum_bonus += 0.5
-    
+    for col, terskler in _VOLUM_BONUS_TERSKLER:
+        verdi = data.get(col, 0)
+        volum_bonus += next((bonus for terskel, bonus in terskler if verdi > terskel), 0)
+
     # Justert total (maks 10)
     justert_total = min(10, max(0, total + bonus_justering + volum_bonus - risiko_justering))
-    
+
     return {
         'gevinst_score': round(gevinst, 2),
         'gjennomforbarhet_score': round(gjennomforbarhet, 2),
@@ -496,16 +691,19 @@ def beregn_prioritering(data):
         'volum_bonus': round(volum_bonus, 2)
     }
 
+# Nedre grense for hver kategori (score >= grense), og kategoriene fra lavest til høyest
+_PRIORITET_GRENSER = np.array([1.0, 4.0, 6.6])
+_PRIORITET_KATEGORIER = np.array(["⚪ IKKE AKTUELL", "🟢 LAV PRIORITET", "🟡 MEDIUM PRIORITET", HOY_PRIORITET], dtype=object)
+
 def get_prioritet_kategori(score):
-    """Returnerer prioritetskategori basert på score (1-10 skala)"""
-    if score >= 6.6:
-        return "🔴 HØY PRIORITET"
-    elif score >= 4.0:
-        return "🟡 MEDIUM PRIORITET"
-    elif score >= 1.0:
-        return "🟢 LAV PRIORITET"
-    else:
-        return "⚪ IKKE AKTUELL"
+    """Returnerer prioritetskategori basert på score (1-10 skala).
+    Tar også imot en array med scorer og gir da en array med kategorier.
+    Manglende score (NaN) gir laveste kategori, som i den gamle if/elif-kjeden"""
+    score = np.asarray(score, dtype=np.float64)
+    trinn = np.searchsorted(_PRIORITET_GRENSER, score, side="right")
+    # searchsorted sorterer NaN etter alle grensene, som ellers ville gitt HØY PRIORITET
+    trinn = np.where(np.isnan(score), 0, trinn)
+    return _PRIORITET_KATEGORIER[trinn]
 
 # --- ADVANCED RPA ANALYSIS HELPERS ---
 
@@ -534,6 +732,14 @@ def beregn_roi_metrics(kostnadsbesparelse, implementeringskostnad, vedlikeholdsk
         'total_kostnader': round(total_kostnader, 0)
     }
 
+# Filformat-anbefalinger: API først, deretter første regel med treff
+_TEKNOLOGI_RE = re.compile(r"(?=(api|pdf|excel|csv|web|browser))")
+_TEKNOLOGI_REGLER = (
+    (frozenset({"pdf"}), "OCR-funksjonalitet nødvendig (PAD OCR/AI Builder)"),
+    (frozenset({"excel", "csv"}), "Desktop flow anbefales"),
+    (frozenset({"web", "browser"}), "Web automation i Power Automate"),
+)
+
 def get_technology_recommendation(filformater, api_tilgang, integrasjon_vanskelighet, antall_prosesser):
     """Anbefaler RPA-teknologi basert på prosesskarakteristikker"""
     recommendations = []
@@ -544,15 +750,13 @@ def get_technology_recommendation(filformater, api_tilgang, integrasjon_vanskeli
         recommendations.append("Power Automate Desktop – Ideell for lavere volum")
     # File format based
     if filformater:
-        f = filformater.lower()
-        if "api" in f or api_tilgang.lower() == "ja":
+        treff = set(_TEKNOLOGI_RE.findall(filformater.lower()))
+        if "api" in treff or api_tilgang.lower() == "ja":
             recommendations.append("API-integrasjon anbefales")
-        elif "pdf" in f:
-            recommendations.append("OCR-funksjonalitet nødvendig (PAD OCR/AI Builder)")
-        elif "excel" in f or "csv" in f:
-            recommendations.append("Desktop flow anbefales")
-        elif "web" in f or "browser" in f:
-            recommendations.append("Web automation i Power Automate")
+        else:
+            anbefaling = next((tekst for formater, tekst in _TEKNOLOGI_REGLER if treff & formater), None)
+            if anbefaling:
+                recommendations.append(anbefaling)
     # Integration complexity
     if "Legacy" in integrasjon_vanskelighet:
         recommendations.append("Skjermskraping med PAD")
@@ -560,45 +764,84 @@ def get_technology_recommendation(filformater, api_tilgang, integrasjon_vanskeli
         recommendations.append("Cloud flows + API-integrasjon")
     return "; ".join(recommendations[:3])  # Return top 3
 
+def _indekser(valg):
+    """Oppslag fra valgmulighet til posisjon, for index= i st.selectbox"""
+    return {v: i for i, v in enumerate(valg)}
+
+# Valgmuligheter for nedtrekkslistene i skjemaet
+FREKVENS_VALG = ("Daglig", "Ukentlig", "Månedlig", "Ved behov", "Sesongbasert")
+_FREKVENS_INDEKS = _indekser(FREKVENS_VALG)
+API_TILGANG_VALG = ("Ja", "Nei", "Ukjent")
+_API_TILGANG_INDEKS = _indekser(API_TILGANG_VALG)
+BRUKEROPPLARING_VALG = ("Minimal opplæring", "Kort introduksjon", "Strukturert opplæring", "Omfattende opplæring")
+_BRUKEROPPLARING_INDEKS = _indekser(BRUKEROPPLARING_VALG)
+PROSESSENDRING_VALG = ("Ingen endring", "Små justeringer", "Moderate endringer", "Betydelige endringer")
+_PROSESSENDRING_INDEKS = _indekser(PROSESSENDRING_VALG)
+MOTSTAND_VALG = ("Ingen motstand", "Lav motstand", "Moderat motstand", "Høy motstand")
+_MOTSTAND_INDEKS = _indekser(MOTSTAND_VALG)
+SESONG_VALG = ("Ingen variasjon", "Lav variasjon (±20%)", "Moderat variasjon (±50%)", "Høy variasjon (±100%)", "Ekstrem variasjon (>100%)")
+_SESONG_INDEKS = _indekser(SESONG_VALG)
+API_TILGJENGELIGHET_VALG = ("Alle systemer har API", "De fleste har API", "Noen har API", "Få har API", "Ingen API")
+_API_TILGJENGELIGHET_INDEKS = _indekser(API_TILGJENGELIGHET_VALG)
+SIKKERHETSKRAV_VALG = ("Lavt", "Medium", "Høyt", "Kritisk")
+_SIKKERHETSKRAV_INDEKS = _indekser(SIKKERHETSKRAV_VALG)
+TESTMILJO_VALG = ("Fullt tilgjengelig", "Begrenset tilgang", "Ikke tilgjengelig")
+_TESTMILJO_INDEKS = _indekser(TESTMILJO_VALG)
+
+# Valgmuligheter for risiko- og bonusfaktorer i skjemaet
+RISIKO_LISTE = ["Høy organisatorisk motstand", "Kritiske systemavhengigheter", "Komplekse godkjenningsflyter", "Høy sikkerhetstilgang"]
+BONUS_LISTE = ["Pilot-/proof-of-concept verdi", "Synergieffekter", "Eksisterende systemintegrasjoner"]
+_RISIKO_SETT = frozenset(RISIKO_LISTE)
+_BONUS_SETT = frozenset(BONUS_LISTE)
+
+# Oppslagstabeller for analysefeltene, bygget én gang i stedet for ved hvert kall
+_INTEGRASJON_SCORES = {
+    "Lav - Standard API/Excel": 1,
+    "Medium - Noe tilpasning nødvendig": 2,
+    "Høy - Komplekse integrasjoner": 4,
+    "Meget høy - Legacy systemer": 5
+}
+_ENDRING_SCORES = {
+    "Minimal - Ingen endring i daglige rutiner": 1,
+    "Lav - Små justeringer i arbeidsflyt": 2,
+    "Medium - Noe opplæring nødvendig": 3,
+    "Høy - Betydelig prosessendring": 4
+}
+# Sesongmønstre med 0.5 i boost i de aktive månedene, og mønstre med fast boost
+_SESONG_MANEDER = {
+    "Høy aktivitet Q4": frozenset({10, 11, 12}),
+    "Høy aktivitet Q1": frozenset({1, 2, 3}),
+    "Høy aktivitet sommer": frozenset({6, 7, 8}),
+    "Høy aktivitet vinter": frozenset({12, 1, 2}),
+}
+_SESONG_FAST_BOOST = {
+    "Månedlige topper": 0.3,
+    "Stabilt hele året": 0.2
+}
+_KRITIKALITET_SCORES = {
+    "Støttefunksjon": 2,
+    "Viktig for daglig drift": 3,
+    "Kritisk for kundeservice": 4,
+    "Regulatorisk påkrevd": 5
+}
+
 def get_automation_complexity_score(teknisk_kompleksitet, integrasjon_vanskelighet, endringsledelse_pavirkning):
     """Beregner automatiseringskompleksitet (1-5 skala)"""
-    integrasjon_score = {
-        "Lav - Standard API/Excel": 1,
-        "Medium - Noe tilpasning nødvendig": 2,
-        "Høy - Komplekse integrasjoner": 4,
-        "Meget høy - Legacy systemer": 5
-    }.get(integrasjon_vanskelighet, 3)
-    endring_score = {
-        "Minimal - Ingen endring i daglige rutiner": 1,
-        "Lav - Små justeringer i arbeidsflyt": 2,
-        "Medium - Noe opplæring nødvendig": 3,
-        "Høy - Betydelig prosessendring": 4
-    }.get(endringsledelse_pavirkning, 2)
+    integrasjon_score = _INTEGRASJON_SCORES.get(integrasjon_vanskelighet, 3)
+    endring_score = _ENDRING_SCORES.get(endringsledelse_pavirkning, 2)
     combined_complexity = min(5, round((teknisk_kompleksitet + integrasjon_score + endring_score) / 3))
     return combined_complexity
 
 def get_seasonal_priority_boost(sesong_mønster):
     """Gir prioritetsboost basert på sesongmønster"""
-    current_month = datetime.now().month
-    boosts = {
-        "Høy aktivitet Q4": 0.5 if current_month in [10, 11, 12] else 0,
-        "Høy aktivitet Q1": 0.5 if current_month in [1, 2, 3] else 0,
-        "Høy aktivitet sommer": 0.5 if current_month in [6, 7, 8] else 0,
-        "Høy aktivitet vinter": 0.5 if current_month in [12, 1, 2] else 0,
-        "Månedlige topper": 0.3,
-        "Stabilt hele året": 0.2
-    }
-    return boosts.get(sesong_mønster, 0)
+    maneder = _SESONG_MANEDER.get(sesong_mønster)
+    if maneder is not None:
+        return 0.5 if datetime.now().month in maneder else 0
+    return _SESONG_FAST_BOOST.get(sesong_mønster, 0)
 
 def get_business_criticality_score(forretningskritikalitet):
     """Konverterer forretningskritikalitet til numerisk score"""
-    scores = {
-        "Støttefunksjon": 2,
-        "Viktig for daglig drift": 3,
-        "Kritisk for kundeservice": 4,
-        "Regulatorisk påkrevd": 5
-    }
-    return scores.get(forretningskritikalitet, 3)
+    return _KRITIKALITET_SCORES.get(forretningskritikalitet, 3)
 
 # --- STREAMLIT APP ---
 def main():
@@ -628,12 +871,21 @@ def main():
     with col_nav2:
         if st.button("📈 Visualisering"):
             st.session_state.vis_side = "Visualisering"
+    with col_nav3:
+        # Lagring og sletting oppdaterer session-dataframen lokalt; her hentes alt på nytt fra Supabase
+        if st.button("🔄 Hent data på nytt", help="Synkroniser med endringer gjort andre steder"):
+            _clear_data_cache()
+            st.session_state.df = last_data()
+            st.session_state.rediger_index = None
     
     if st.session_state.vis_side == "Hovedside":
         vis_hovedside()
     elif st.session_state.vis_side == "Visualisering":
         vis_visualisering()
 
+    if DEBUG:
+        vis_cache_stats()
+
 def vis_hovedside():
     """Viser hovedsiden med prosessregistrering og oversikt"""
     col1, col2 = st.columns([1, 1.5])
@@ -644,8 +896,10 @@ def vis_hovedside():
 
         # Sjekk om vi er i redigeringsmodus
         rediger_mode = st.session_state.rediger_index is not None
+        current_row = None
         if rediger_mode:
-            current_row = st.session_state.df.iloc[st.session_state.rediger_index]
+            # Hent raden én gang i stedet for ett iloc-oppslag per felt
+            current_row = st.session_state.df.iloc[st.session_state.rediger_index].to_dict()
             st.info(f"Redigerer prosess: {current_row['prosessnavn']}")
             if st.button("❌ Avbryt redigering"):
                 st.session_state.rediger_index = None
@@ -653,227 +907,236 @@ def vis_hovedside():
 
         # Hent verdier for redigering
         def get_val(col, default):
-            return get_val_safe(st.session_state.df, st.session_state.rediger_index, col, default)
-
-        # Grunnleggende informasjon
-        st.markdown("**Grunnleggende informasjon**")
-        prosessnavn = st.text_input("Prosessnavn*", value=get_val('prosessnavn', ""))
-        prosesseier = st.text_input("Prosesseier*", value=get_val('prosesseier', ""))
-        avdeling = st.text_input("Avdeling/seksjon*", value=get_val('avdeling', ""))
-        prosessbeskrivelse = st.text_area("Beskrivelse*", value=get_val('prosessbeskrivelse', ""))
-
-        col1a, col1b = st.columns(2)
-        with col1a:
-            trigger = st.text_input("Utløser", value=get_val('trigger', ""))
-        with col1b:
-            frekvens = st.selectbox("Frekvens",
-                ["Daglig", "Ukentlig", "Månedlig", "Ved behov", "Sesongbasert"],
-                index=["Daglig", "Ukentlig", "Månedlig", "Ved behov", "Sesongbasert"].index(get_val('frekvens', "Daglig"))
+            return get_val_safe(current_row, col, default)
+
+        # Skjemaet samler inputene slik at siden bare kjøres på nytt ved innsending
+        with st.form("prosess_form", clear_on_submit=False):
+            # Grunnleggende informasjon
+            st.markdown("**Grunnleggende informasjon**")
+            prosessnavn = st.text_input("Prosessnavn*", value=get_val('prosessnavn', ""))
+            prosesseier = st.text_input("Prosesseier*", value=get_val('prosesseier', ""))
+            avdeling = st.text_input("Avdeling/seksjon*", value=get_val('avdeling', ""))
+            prosessbeskrivelse = st.text_area("Beskrivelse*", value=get_val('prosessbeskrivelse', ""))
+
+            col1a, col1b = st.columns(2)
+            with col1a:
+                trigger = st.text_input("Utløser", value=get_val('trigger', ""))
+            with col1b:
+                frekvens = st.selectbox("Frekvens",
+                    FREKVENS_VALG,
+                    index=_FREKVENS_INDEKS.get(get_val('frekvens', "Daglig"), 0)
+                )
+
+            # Kvantitative data
+            st.markdown("**Kvantitative data**")
+            col2a, col2b = st.columns(2)
+            with col2a:
+                antall_prosesser = st.number_input("Antall per måned*", min_value=0, value=int(get_val('antall_prosesser', 0)))
+                personer_involvert = st.number_input("Personer involvert", min_value=1, value=int(get_val('personer_involvert', 1)))
+            with col2b:
+                behandlingstid = st.number_input("Behandlingstid (min)*", min_value=0, value=int(get_val('behandlingstid', 0)))
+                feilrate = st.number_input("Feilrate (%)", min_value=0.0, max_value=100.0, value=float(get_val('feilrate', 0.0)), step=0.1)
+
+            kostnad_per_time = st.number_input("Kostnad per time (kr)", min_value=0, value=int(get_val('kostnad_per_time', 500)))
+
+            # Teknisk informasjon
+            st.markdown("**Teknisk informasjon**")
+            it_systemer = st.text_area("IT-systemer", value=get_val('it_systemer', ""))
+            datakilder = st.text_area("Datakilder", value=get_val('datakilder', ""))
+            filformater = st.text_area("Filformater", value=get_val('filformater', ""))
+            api_tilgang = st.selectbox("API-tilgang", API_TILGANG_VALG,
+                index=_API_TILGANG_INDEKS.get(get_val('api_tilgang', "Ja"), 0)
             )
 
-        # Kvantitative data
-        st.markdown("**Kvantitative data**")
-        col2a, col2b = st.columns(2)
-        with col2a:
-            antall_prosesser = st.number_input("Antall per måned*", min_value=0, value=int(get_val('antall_prosesser', 0)))
-            personer_involvert = st.number_input("Personer involvert", min_value=1, value=int(get_val('personer_involvert', 1)))
-        with col2b:
-            behandlingstid = st.number_input("Behandlingstid (min)*", min_value=0, value=int(get_val('behandlingstid', 0)))
-            feilrate = st.number_input("Feilrate (%)", min_value=0.0, max_value=100.0, value=float(get_val('feilrate', 0.0)), step=0.1)
-
-        kostnad_per_time = st.number_input("Kostnad per time (kr)", min_value=0, value=int(get_val('kostnad_per_time', 500)))
-
-        # Teknisk informasjon
-        st.markdown("**Teknisk informasjon**")
-        it_systemer = st.text_area("IT-systemer", value=get_val('it_systemer', ""))
-        datakilder = st.text_area("Datakilder", value=get_val('datakilder', ""))
-        filformater = st.text_area("Filformater", value=get_val('filformater', ""))
-        api_tilgang = st.selectbox("API-tilgang", ["Ja", "Nei", "Ukjent"],
-            index=["Ja", "Nei", "Ukjent"].index(get_val('api_tilgang', "Ja"))
-        )
-
-        # --- Endringsutfordringer (organisatorisk) MÅ komme før scoreberegningen! ---
-        st.markdown("**Endringsutfordringer (organisatorisk)**")
-        col_change1, col_change2 = st.columns(2)
-        with col_change1:
-            brukeropplaering = st.selectbox(
-                "Opplæringsbehov for brukere",
-                ["Minimal opplæring", "Kort introduksjon", "Strukturert opplæring", "Omfattende opplæring"],
-                index=["Minimal opplæring", "Kort introduksjon", "Strukturert opplæring", "Omfattende opplæring"].index(get_val('brukeropplaering', "Kort introduksjon"))
-            )
-            prosessendring = st.selectbox(
-                "Grad av prosessendring",
-                ["Ingen endring", "Små justeringer", "Moderate endringer", "Betydelige endringer"],
-                index=["Ingen endring", "Små justeringer", "Moderate endringer", "Betydelige endringer"].index(get_val('prosessendring', "Små justeringer"))
-            )
-        with col_change2:
-            motstand_forventet = st.selectbox(
-                "Forventet motstand",
-                ["Ingen motstand", "Lav motstand", "Moderat motstand", "Høy motstand"],
-                index=["Ingen motstand", "Lav motstand", "Moderat motstand", "Høy motstand"].index(get_val('motstand_forventet', "Lav motstand"))
-            )
-
-        # --- Beregn scores NÅ, etter at alle inputfelt er deklarert ---
-        auto_tid, auto_vol, auto_kval, auto_tek, auto_datakompleksitet, auto_regel = beregn_kvantitative_scores(
-            behandlingstid, antall_prosesser, feilrate, personer_involvert, kostnad_per_time,
-            filformater, datakilder, api_tilgang, brukeropplaering, prosessendring, motstand_forventet
-        )
-        tidsbesparelse = auto_tid
-        volum = auto_vol
-        kvalitetsforbedring = auto_kval
-        teknisk_kompleksitet = auto_tek
-        datakompleksitet = auto_datakompleksitet
-        regelstabilitet = auto_regel
-
-        # ROI/analyse-felt
-        st.markdown("**Avansert RPA-analyse**")
-        col_roi1, col_roi2 = st.columns(2)
-        with col_roi1:
-            estimert_implementeringstid = st.number_input(
-                "Estimert implementeringstid (måneder)",
-                min_value=1, max_value=24,
-                value=int(get_val('estimert_implementeringstid', 3))
-            )
-            implementeringskostnad = st.number_input(
-                "Implementeringskostnad (kr)",
-                min_value=0,
-                value=int(get_val('implementeringskostnad', 0))
-            )
-        with col_roi2:
-            vedlikeholdskostnad_aar = st.number_input(
-                "Årlige driftskostnader (kr)",
-                min_value=0,
-                value=int(get_val('vedlikeholdskostnad_aar', 0))
-            )
-            lisenskostnad_aarlig = st.number_input(
-                "Årlige lisenskostnader (kr)",
-                min_value=0,
-                value=int(get_val('lisenskostnad_aarlig', 0))
-            )
-
-        # Seasonal Analysis
-        st.markdown("**Sesonganalyse**")
-        sesong_variasjon = st.selectbox(
-            "Sesongvariasjon i prosessvolum",
-            ["Ingen variasjon", "Lav variasjon (±20%)", "Moderat variasjon (±50%)", "Høy variasjon (±100%)", "Ekstrem variasjon (>100%)"],
-            index=["Ingen variasjon", "Lav variasjon (±20%)", "Moderat variasjon (±50%)", "Høy variasjon (±100%)", "Ekstrem variasjon (>100%)"].index(get_val('sesong_variasjon', "Ingen variasjon"))
-        )
-        peak_perioder = st.text_input(
-            "Peak-perioder (f.eks. 'Q4, Januar, Juni')",
-            value=get_val('peak_perioder', "")
-        )
-
-        # Integration Difficulty
-        st.markdown("**Integrasjonsutfordringer**")
-        col_int1, col_int2 = st.columns(2)
-        with col_int1:
-            antall_systemer = st.number_input(
-                "Antall IT-systemer involvert",
-                min_value=1, max_value=20,
-                value=int(get_val('antall_systemer', 2))
-            )
-            api_tilgjengelighet = st.selectbox(
-                "API-tilgjengelighet",
-                ["Alle systemer har API", "De fleste har API", "Noen har API", "Få har API", "Ingen API"],
-                index=["Alle systemer har API", "De fleste har API", "Noen har API", "Få har API", "Ingen API"].index(get_val('api_tilgjengelighet', "Noen har API"))
+            # --- Endringsutfordringer (organisatorisk) MÅ komme før scoreberegningen! ---
+            st.markdown("**Endringsutfordringer (organisatorisk)**")
+            col_change1, col_change2 = st.columns(2)
+            with col_change1:
+                brukeropplaering = st.selectbox(
+                    "Opplæringsbehov for brukere",
+                    BRUKEROPPLARING_VALG,
+                    index=_BRUKEROPPLARING_INDEKS.get(get_val('brukeropplaering', "Kort introduksjon"), 0)
+                )
+                prosessendring = st.selectbox(
+                    "Grad av prosessendring",
+                    PROSESSENDRING_VALG,
+                    index=_PROSESSENDRING_INDEKS.get(get_val('prosessendring', "Små justeringer"), 0)
+                )
+            with col_change2:
+                motstand_forventet = st.selectbox(
+                    "Forventet motstand",
+                    MOTSTAND_VALG,
+                    index=_MOTSTAND_INDEKS.get(get_val('motstand_forventet', "Lav motstand"), 0)
+                )
+
+            # --- Beregn scores NÅ, etter at alle inputfelt er deklarert ---
+            auto_tid, auto_vol, auto_kval, auto_tek, auto_datakompleksitet, auto_regel = beregn_kvantitative_scores(
+                behandlingstid, antall_prosesser, feilrate, personer_involvert, kostnad_per_time,
+                filformater, datakilder, api_tilgang, brukeropplaering, prosessendring, motstand_forventet
             )
-        with col_int2:
-            sikkerhetskrav = st.selectbox(
-                "Sikkerhetskrav",
-                ["Lavt", "Medium", "Høyt", "Kritisk"],
-                index=["Lavt", "Medium", "Høyt", "Kritisk"].index(get_val('sikkerhetskrav', "Medium"))
+            tidsbesparelse = auto_tid
+            volum = auto_vol
+            kvalitetsforbedring = auto_kval
+            teknisk_kompleksitet = auto_tek
+            datakompleksitet = auto_datakompleksitet
+            regelstabilitet = auto_regel
+
+            # ROI/analyse-felt
+            st.markdown("**Avansert RPA-analyse**")
+            col_roi1, col_roi2 = st.columns(2)
+            with col_roi1:
+                estimert_implementeringstid = st.number_input(
+                    "Estimert implementeringstid (måneder)",
+                    min_value=1, max_value=24,
+                    value=int(get_val('estimert_implementeringstid', 3))
+                )
+                implementeringskostnad = st.number_input(
+                    "Implementeringskostnad (kr)",
+                    min_value=0,
+                    value=int(get_val('implementeringskostnad', 0))
+                )
+            with col_roi2:
+                vedlikeholdskostnad_aar = st.number_input(
+                    "Årlige driftskostnader (kr)",
+                    min_value=0,
+                    value=int(get_val('vedlikeholdskostnad_aar', 0))
+                )
+                lisenskostnad_aarlig = st.number_input(
+                    "Årlige lisenskostnader (kr)",
+                    min_value=0,
+                    value=int(get_val('lisenskostnad_aarlig', 0))
+                )
+
+            # Seasonal Analysis
+            st.markdown("**Sesonganalyse**")
+            sesong_variasjon = st.selectbox(
+                "Sesongvariasjon i prosessvolum",
+                SESONG_VALG,
+                index=_SESONG_INDEKS.get(get_val('sesong_variasjon', "Ingen variasjon"), 0)
             )
-            testmiljo_tilgang = st.selectbox(
-                "Testmiljø tilgjengelighet",
-                ["Fullt tilgjengelig", "Begrenset tilgang", "Ikke tilgjengelig"],
-                index=["Fullt tilgjengelig", "Begrenset tilgang", "Ikke tilgjengelig"].index(get_val('testmiljo_tilgang', "Fullt tilgjengelig"))
+            peak_perioder = st.text_input(
+                "Peak-perioder (f.eks. 'Q4, Januar, Juni')",
+                value=get_val('peak_perioder', "")
             )
 
-        # Prioriteringsmatrise
-        st.markdown("**Prioriteringsmatrise (1-5) - Automatisk beregnet fra kvantitative data**")
-        col3a, col3b = st.columns(2)
-        with col3a:
-            st.markdown("**Gevinst-relaterte faktorer:**")
-            st.info(f"🕒 **Tidsbesparelse:** {tidsbesparelse}/5\n(Basert på {behandlingstid} min behandlingstid)")
-            st.info(f"📊 **Volum:** {volum}/5\n(Basert på {antall_prosesser} prosesser/måned)")
-            forklaring_kvalitet = []
-            if brukeropplaering in ["Kort introduksjon", "Strukturert opplæring"]:
-                forklaring_kvalitet.append("Lett opplæring (+1)")
-            if prosessendring == "Små justeringer":
-                forklaring_kvalitet.append("Små endringer (+1)")
-            if motstand_forventet == "Lav motstand":
-                forklaring_kvalitet.append("Lav motstand (+1)")
-            kvalitet_tekst = f"✅ **Kvalitetsforbedring:** {kvalitetsforbedring}/5"
-            if forklaring_kvalitet:
-                kvalitet_tekst += f"\n({', '.join(forklaring_kvalitet)})"
-            st.info(kvalitet_tekst)
-
-        with col3b:
-            st.markdown("**Gjennomførbarhet-relaterte faktorer:**")
-            st.info(f"🔧 **Teknisk kompleksitet:** {teknisk_kompleksitet}/5\n(Basert på filformater)")
-            antall_datakilder = len([x.strip() for x in datakilder.split(',') if x.strip()]) if datakilder else 0
-            antall_filformater = len([x.strip() for x in filformater.split(',') if x.strip()]) if filformater else 0
-
-            kompleksitet_detaljer = []
-            if antall_datakilder > 1:
-                kompleksitet_detaljer.append(f"{antall_datakilder} datakilder")
-            elif antall_datakilder == 1:
-                kompleksitet_detaljer.append("1 datakilde")
-
-            if antall_filformater > 1:
-                kompleksitet_detaljer.append(f"{antall_filformater} filformater")
-            elif antall_filformater == 1:
-                kompleksitet_detaljer.append("1 filformat")
-
-            if api_tilgang and api_tilgang.lower() == "ja":
-                kompleksitet_detaljer.append("API-tilgang")
-
-            # Sett sammen tekst uten kroner
-            kompleksitet_tekst = f"💾 **Datakompleksitet:** {datakompleksitet}/5\n(Basert på "
-            kompleksitet_tekst += ", ".join(kompleksitet_detaljer) if kompleksitet_detaljer else "enkel struktur"
-            kompleksitet_tekst += ")"
-
-            st.info(kompleksitet_tekst)
-
-            st.info(f"📋 **Regelstabilitet:** {regelstabilitet}/5\n(Basert på prosessvolum og behandlingstid)")
-
-        # Strategiske faktorer (kan justeres manuelt)
-        st.markdown("**Strategiske faktorer (kan justeres manuelt):**")
-        col3c, col3d = st.columns(2)
-        with col3c:
-            org_pavirkning = st.select_slider("Organisatorisk påvirkning", options=[1,2,3,4,5],
-                                              value=int(get_val('org_pavirkning', 3)))
-            brukerpavirkning = st.select_slider("Brukerpåvirkning", options=[1,2,3,4,5],
-                                                value=int(get_val('brukerpavirkning', 3)))
-        with col3d:
-            regelverksoverholdelse = st.select_slider("Regelverksoverholdelse", options=[1,2,3,4,5],
-                                                      value=int(get_val('regelverksoverholdelse', 3)))
-
-        # Risiko og bonus faktorer
-        st.markdown("**Risiko og bonus faktorer**")
-        risiko_liste = ["Høy organisatorisk motstand", "Kritiske systemavhengigheter", "Komplekse godkjenningsflyter", "Høy sikkerhetstilgang"]
-        bonus_liste = ["Pilot-/proof-of-concept verdi", "Synergieffekter", "Eksisterende systemintegrasjoner"]
-        current_risiko_str = get_val('risiko_faktorer', "")
-        current_bonus_str = get_val('bonus_faktorer', "")
-        current_risiko = [item.strip() for item in current_risiko_str.split(",") if item.strip() in risiko_liste] if current_risiko_str else []
-        current_bonus = [item.strip() for item in current_bonus_str.split(",") if item.strip() in bonus_liste] if current_bonus_str else []
-        risiko_faktorer = st.multiselect("Risikofaktorer (-1 poeng hver)", risiko_liste, default=current_risiko)
-        bonus_faktorer = st.multiselect("Bonusfaktorer (+1 poeng hver)", bonus_liste, default=current_bonus)
-
-        # Score preview
-        temp_data = {
-            'tidsbesparelse': tidsbesparelse, 'volum': volum, 'kvalitetsforbedring': kvalitetsforbedring,
-            'teknisk_kompleksitet': teknisk_kompleksitet, 'datakompleksitet': datakompleksitet, 'regelstabilitet': regelstabilitet,
-            'org_pavirkning': org_pavirkning, 'brukerpavirkning': brukerpavirkning, 'regelverksoverholdelse': regelverksoverholdelse,
-            'risiko_faktorer': risiko_faktorer, 'bonus_faktorer': bonus_faktorer,
-            'antall_prosesser': antall_prosesser, 'behandlingstid': behandlingstid, 'feilrate': feilrate
-        }
-        scoring = beregn_prioritering(temp_data)
-        prioritet = get_prioritet_kategori(scoring['justert_score'])
-        st.info(f"**Prioritet:** {prioritet}  \n**Score:** {scoring['justert_score']}/10  \n**Gevinst:** {scoring['gevinst_score']}/10 | **Gjennomførbarhet:** {scoring['gjennomforbarhet_score']}/10 | **Strategisk:** {scoring['strategisk_score']}/10")
+            # Integration Difficulty
+            st.markdown("**Integrasjonsutfordringer**")
+            col_int1, col_int2 = st.columns(2)
+            with col_int1:
+                antall_systemer = st.number_input(
+                    "Antall IT-systemer involvert",
+                    min_value=1, max_value=20,
+                    value=int(get_val('antall_systemer', 2))
+                )
+                api_tilgjengelighet = st.selectbox(
+                    "API-tilgjengelighet",
+                    API_TILGJENGELIGHET_VALG,
+                    index=_API_TILGJENGELIGHET_INDEKS.get(get_val('api_tilgjengelighet', "Noen har API"), 0)
+                )
+            with col_int2:
+                sikkerhetskrav = st.selectbox(
+                    "Sikkerhetskrav",
+                    SIKKERHETSKRAV_VALG,
+                    index=_SIKKERHETSKRAV_INDEKS.get(get_val('sikkerhetskrav', "Medium"), 0)
+                )
+                testmiljo_tilgang = st.selectbox(
+                    "Testmiljø tilgjengelighet",
+                    TESTMILJO_VALG,
+                    index=_TESTMILJO_INDEKS.get(get_val('testmiljo_tilgang', "Fullt tilgjengelig"), 0)
+                )
+
+            # Prioriteringsmatrise
+            st.markdown("**Prioriteringsmatrise (1-5) - Automatisk beregnet fra kvantitative data**")
+            col3a, col3b = st.columns(2)
+            with col3a:
+                st.markdown("**Gevinst-relaterte faktorer:**")
+                # Én infoboks per kolonne, med ett avsnitt per faktor
+                gevinst_linjer = [
+                    f"🕒 **Tidsbesparelse:** {tidsbesparelse}/5\n(Basert på {behandlingstid} min behandlingstid)",
+                    f"📊 **Volum:** {volum}/5\n(Basert på {antall_prosesser} prosesser/måned)",
+                ]
+                forklaring_kvalitet = []
+                if brukeropplaering in ["Kort introduksjon", "Strukturert opplæring"]:
+                    forklaring_kvalitet.append("Lett opplæring (+1)")
+                if prosessendring == "Små justeringer":
+                    forklaring_kvalitet.append("Små endringer (+1)")
+                if motstand_forventet == "Lav motstand":
+                    forklaring_kvalitet.append("Lav motstand (+1)")
+                kvalitet_tekst = f"✅ **Kvalitetsforbedring:** {kvalitetsforbedring}/5"
+                if forklaring_kvalitet:
+                    kvalitet_tekst += f"\n({', '.join(forklaring_kvalitet)})"
+                gevinst_linjer.append(kvalitet_tekst)
+                st.info("\n\n".join(gevinst_linjer), icon="📈")
+
+            with col3b:
+                st.markdown("**Gjennomførbarhet-relaterte faktorer:**")
+                antall_datakilder = len(_parse_csv_list(datakilder)) if datakilder else 0
+                antall_filformater = len(_parse_csv_list(filformater)) if filformater else 0
+
+                kompleksitet_detaljer = []
+                if antall_datakilder > 1:
+                    kompleksitet_detaljer.append(f"{antall_datakilder} datakilder")
+                elif antall_datakilder == 1:
+                    kompleksitet_detaljer.append("1 datakilde")
+
+                if antall_filformater > 1:
+                    kompleksitet_detaljer.append(f"{antall_filformater} filformater")
+                elif antall_filformater == 1:
+                    kompleksitet_detaljer.append("1 filformat")
+
+                if api_tilgang and api_tilgang.lower() == "ja":
+                    kompleksitet_detaljer.append("API-tilgang")
+
+                # Sett sammen tekst uten kroner
+                kompleksitet_tekst = f"💾 **Datakompleksitet:** {datakompleksitet}/5\n(Basert på "
+                kompleksitet_tekst += ", ".join(kompleksitet_detaljer) if kompleksitet_detaljer else "enkel struktur"
+                kompleksitet_tekst += ")"
+
+                st.info("\n\n".join([
+                    f"🔧 **Teknisk kompleksitet:** {teknisk_kompleksitet}/5\n(Basert på filformater)",
+                    kompleksitet_tekst,
+                    f"📋 **Regelstabilitet:** {regelstabilitet}/5\n(Basert på prosessvolum og behandlingstid)",
+                ]), icon="🛠️")
+
+            # Strategiske faktorer (kan justeres manuelt)
+            st.markdown("**Strategiske faktorer (kan justeres manuelt):**")
+            col3c, col3d = st.columns(2)
+            with col3c:
+                org_pavirkning = st.select_slider("Organisatorisk påvirkning", options=[1,2,3,4,5],
+                                                  value=int(get_val('org_pavirkning', 3)))
+                brukerpavirkning = st.select_slider("Brukerpåvirkning", options=[1,2,3,4,5],
+                                                    value=int(get_val('brukerpavirkning', 3)))
+            with col3d:
+                regelverksoverholdelse = st.select_slider("Regelverksoverholdelse", options=[1,2,3,4,5],
+                                                          value=int(get_val('regelverksoverholdelse', 3)))
+
+            # Risiko og bonus faktorer
+            st.markdown("**Risiko og bonus faktorer**")
+            current_risiko_str = get_val('risiko_faktorer', "")
+            current_bonus_str = get_val('bonus_faktorer', "")
+            current_risiko = [item for item in _parse_csv_list(current_risiko_str) if item in _RISIKO_SETT] if current_risiko_str else []
+            current_bonus = [item for item in _parse_csv_list(current_bonus_str) if item in _BONUS_SETT] if current_bonus_str else []
+            risiko_faktorer = st.multiselect("Risikofaktorer (-1 poeng hver)", RISIKO_LISTE, default=current_risiko)
+            bonus_faktorer = st.multiselect("Bonusfaktorer (+1 poeng hver)", BONUS_LISTE, default=current_bonus)
+
+            # Score preview
+            temp_data = {
+                'tidsbesparelse': tidsbesparelse, 'volum': volum, 'kvalitetsforbedring': kvalitetsforbedring,
+                'teknisk_kompleksitet': teknisk_kompleksitet, 'datakompleksitet': datakompleksitet, 'regelstabilitet': regelstabilitet,
+                'org_pavirkning': org_pavirkning, 'brukerpavirkning': brukerpavirkning, 'regelverksoverholdelse': regelverksoverholdelse,
+                'risiko_faktorer': risiko_faktorer, 'bonus_faktorer': bonus_faktorer,
+                'antall_prosesser': antall_prosesser, 'behandlingstid': behandlingstid, 'feilrate': feilrate
+            }
+            scoring = beregn_prioritering(temp_data)
+            prioritet = get_prioritet_kategori(scoring['justert_score'])
+            with st.expander("Live forhåndsvisning", expanded=True):
+                st.info(f"**Prioritet:** {prioritet}  \n**Score:** {scoring['justert_score']}/10  \n**Gevinst:** {scoring['gevinst_score']}/10 | **Gjennomførbarhet:** {scoring['gjennomforbarhet_score']}/10 | **Strategisk:** {scoring['strategisk_score']}/10")
+                st.form_submit_button("🔄 Oppdater forhåndsvisning")
+
+            lagre = st.form_submit_button("💾 Lagre prosess", type="primary")
 
         # Lagre knapp
-        if st.button("💾 Lagre prosess", type="primary"):
+        if lagre:
             arsvolum = to_int(antall_prosesser) * 12
             arslig_tidsbesparing = to_int((arsvolum * to_int(behandlingstid)) / 60)
 
@@ -892,8 +1155,6 @@ def vis_hovedside():
                 vedlikeholdskostnad_aar, estimert_implementeringstid, 3  # f.eks. 3 år levetid
             )
 
-            roi_metrics = {k: int(round(v)) for k, v in roi_metrics.items()}
-
             teknologi_anbefaling = get_technology_recommendation(
                 filformater, api_tilgang, "Medium - Noe tilpasning nødvendig", antall_prosesser  # Justér evt. felt
             )
@@ -907,7 +1168,7 @@ def vis_hovedside():
                 'automation_complexity_score': automation_complexity_score,
                 'seasonal_boost': seasonal_boost,
                 'forretningskritikalitet_score': forretningskritikalitet_score,
-                'roi_percentage': roi_metrics['roi_percentage'],
+                'roi_percentage': to_int(roi_metrics['roi_percentage']),
             })
 
             lagre_prosess(
@@ -954,20 +1215,13 @@ def lagre_prosess(
         st.error(f"Følgende felt mangler: {', '.join(mangler)}")
         return
 
-    # --- TALLFELT - STRIKT INT ENFORCEMENT ---
-    def to_int(x):
-        try:
-            return int(round(float(x)))
-        except Exception:
-            return 0
-
-    # --- BEREGNDE VERDIER ---
+    # --- BEREGNDE VERDIER (tallfelt går gjennom to_int, som returnerer int direkte) ---
     arsvolum = to_int(antall_prosesser) * 12
     arslig_tidsbesparing = to_int((arsvolum * to_int(behandlingstid)) / 60)
     kostnadsbesparelse = to_int(arslig_tidsbesparing * to_int(kostnad_per_time))
     feilrate_int = to_int(feilrate)
 
-    # --- ROI METRIKKER (bruker int) ---
+    # --- ROI METRIKKER (avrundes her, én gang) ---
     roi_dict = {k: to_int(v) for k, v in roi_metrics.items()}
 
     # --- LAG DATA-DICT ---
@@ -983,9 +1237,9 @@ def lagre_prosess(
         'personer_involvert': to_int(personer_involvert),
         'feilrate': feilrate_int,
         'kostnad_per_time': to_int(kostnad_per_time),
-        'arsvolum': to_int(arsvolum),
-        'arslig_tidsbesparing': to_int(arslig_tidsbesparing),
-        'kostnadsbesparelse': to_int(kostnadsbesparelse),
+        'arsvolum': arsvolum,
+        'arslig_tidsbesparing': arslig_tidsbesparing,
+        'kostnadsbesparelse': kostnadsbesparelse,
         'it_systemer': it_systemer,
         'datakilder': datakilder,
         'filformater': filformater,
@@ -1034,19 +1288,28 @@ def lagre_prosess(
     }
 
     # --- LAGRE ELLER OPPDATERE ---
+    # Session-dataframe oppdateres lokalt med radene Supabase returnerer (ingen ny full henting).
+    # De nye radene types før concat, så bare kategorikolonnene må gjøres om for hele tabellen
+    df = st.session_state.df
     if rediger_mode:
-        current_row = st.session_state.df.iloc[st.session_state.rediger_index]
+        pos = st.session_state.rediger_index
+        current_row = df.iloc[pos]
         prosess_id = current_row['id']
-        if oppdater_data_in_supabase(prosess_id, data_dict):
+        oppdatert_rad = oppdater_data_in_supabase(prosess_id, data_dict)
+        if oppdatert_rad:
             st.success(f"Prosess '{prosessnavn}' er oppdatert!")
             st.session_state.rediger_index = None
-            st.session_state.df = last_data()
+            st.session_state.df = _optimize_dtypes(pd.concat(
+                [df.iloc[:pos], _optimize_dtypes(_rows_to_frame([oppdatert_rad])), df.iloc[pos + 1:]], ignore_index=True
+            ))
         else:
             st.error("Kunne ikke oppdatere prosessen i databasen")
     else:
-        if lagre_data_to_supabase(data_dict):
+        lagrede_rader = lagre_data_to_supabase(data_dict)
+        if lagrede_rader:
             st.success(f"Prosess '{prosessnavn}' er lagret!")
-            st.session_state.df = last_data()
+            # Nyeste først, som i last_data()
+            st.session_state.df = _optimize_dtypes(pd.concat([_optimize_dtypes(_rows_to_frame(lagrede_rader)), df], ignore_index=True))
         else:
             st.error("Kunne ikke lagre prosessen i databasen")
 
@@ -1054,8 +1317,13 @@ def lagre_prosess(
 
 
 
+@st.fragment
 def vis_oversikt():
-    """Viser oversikt over prosesser"""
+    """Viser oversikt over prosesser.
+
+    Kjøres som fragment: filtrering kjører bare denne delen på nytt, ikke skjemaet ved siden av.
+    Rediger/slett bruker st.rerun(), som kjører hele appen på nytt.
+    """
     st.subheader("📊 Prosessoversikt")
     
     df = st.session_state.df
@@ -1068,36 +1336,28 @@ def vis_oversikt():
     st.markdown("**Filtrer prosesser**")
     col1, col2, col3 = st.columns(3)
     with col1:
-        avd_filter = st.selectbox("Avdeling", ["Alle"] + sorted(df['avdeling'].dropna().unique().tolist()))
+        avd_filter = st.selectbox("Avdeling", ["Alle"] + _sorted_values(df['avdeling']))
     with col2:
-        prioritet_filter = st.selectbox("Prioritet", ["Alle"] + sorted(df['prioritet'].dropna().unique().tolist()))
+        prioritet_filter = st.selectbox("Prioritet", ["Alle"] + _sorted_values(df['prioritet']))
     with col3:
         min_score = st.slider("Minimum score", 0.0, 10.0, 0.0)
 
-    # Apply filters to get filtered dataframe
-    filtered_df = df.copy()
-    if avd_filter != "Alle":
-        filtered_df = filtered_df[filtered_df['avdeling'] == avd_filter]
-    if prioritet_filter != "Alle":
-        filtered_df = filtered_df[filtered_df['prioritet'] == prioritet_filter]
-    filtered_df = filtered_df[pd.to_numeric(filtered_df['justert_score'], errors='coerce') >= min_score]
+    # Let Supabase apply the filters so only matching rows are transferred
+    avd_param = avd_filter if avd_filter != "Alle" else None
+    prioritet_param = prioritet_filter if prioritet_filter != "Alle" else None
+    filtered_df = last_data(
+        columns=OVERSIKT_COLUMNS, avdeling=avd_param, prioritet=prioritet_param, min_score=min_score
+    )
 
     # Dynamic metrics based on filters
     if not filtered_df.empty:
-        # Calculate metrics for filtered data
-        antall_prosesser = len(filtered_df)
-        total_besparelse = filtered_df.apply(
-            lambda row: beregn_realistisk_kostnadsbesparelse(
-                row['arslig_tidsbesparing'],
-                row['kostnad_per_time'],
-                row.get('lisenskostnad_aarlig', 0),
-                row.get('vedlikeholdskostnad_aar', 0)
-            ),
-            axis=1
-        ).sum()
-
-        total_tid = pd.to_numeric(filtered_df['arslig_tidsbesparing'], errors='coerce').sum()
-        hoy_prioritet = filtered_df['prioritet'].str.contains("HØY", na=False).sum()
+        # Tabellen formateres én gang per filterkombinasjon (cachet som last_data)
+        # Metrics for filtered data come from the same rows as the table (no extra round trip)
+        oversikt_tabell, stats = hent_oversikt_tabell(avd_param, prioritet_param, min_score)
+        antall_prosesser = stats['cnt']
+        total_besparelse = stats['sum_kost']
+        total_tid = stats['sum_tid']
+        hoy_prioritet = stats['hoy_cnt']
         
         # Create dynamic title based on filters
         title_parts = []
@@ -1136,59 +1396,363 @@ def vis_oversikt():
             
             
         
-      # 1. Start med kopi av alle relevante rader
-        display_df = filtered_df.copy()
-
-        # 2. Realistisk besparelse-kolonne
-        def beregn_realistisk_besparelse_rad(row):
-            return beregn_realistisk_kostnadsbesparelse(
-                row['arslig_tidsbesparing'],
-                row['kostnad_per_time'],
-                row.get('lisenskostnad_aarlig', 0),
-                row.get('vedlikeholdskostnad_aar', 0)
-            )
-
-        display_df['Årlig besparelse (inkl. arb.g.avg., lisens, drift)'] = display_df.apply(beregn_realistisk_besparelse_rad, axis=1)
-        display_df['Årlig besparelse (inkl. arb.g.avg., lisens, drift)'] = display_df['Årlig besparelse (inkl. arb.g.avg., lisens, drift)'].apply(lambda x: f"{x:,.0f} kr")
-        display_df['arslig_tidsbesparing'] = pd.to_numeric(display_df['arslig_tidsbesparing'], errors='coerce').apply(lambda x: f"{x:,.0f} timer")
-        display_df['justert_score'] = pd.to_numeric(display_df['justert_score'], errors='coerce').round(1)
-
-        # 3. Velg kolonner til visning til slutt!
-        display_cols = [
-            'prosessnavn',
-            'avdeling',
-            'prioritet',
-            'justert_score',
-            'Årlig besparelse (inkl. arb.g.avg., lisens, drift)',
-            'arslig_tidsbesparing'
-        ]
-        st.dataframe(display_df[display_cols], use_container_width=True)
+        st.dataframe(oversikt_tabell, use_container_width=True)
 
         
-        # Rediger og slett knapper
+        # Rediger og slett: én velger og to knapper i stedet for et knappepar per prosess,
+        # så antall widgets er det samme uansett hvor mange prosesser filteret gir
         st.markdown("**Rediger/Slett prosesser**")
-        for idx, row in filtered_df.iterrows():
-            col1, col2, col3 = st.columns([6, 1, 1])
-            with col1:
-                st.write(f"**{row['prosessnavn']}** - {row['avdeling']} - {row['prioritet']}")
-            with col2:
-                if st.button("✏️", key=f"edit_{idx}", help="Rediger"):
-                    # Find the index in the original dataframe
-                    original_idx = df[df['id'] == row['id']].index[0]
-                    st.session_state.rediger_index = original_idx
-                    st.rerun()
-            with col3:
-                if st.button("🗑️", key=f"delete_{idx}", help="Slett"):
-                    if slett_prosess_from_supabase(row['id']):
-                        st.success(f"Prosess '{row['prosessnavn']}' er slettet!")
-                        st.session_state.df = last_data()
-                        st.rerun()
-                    else:
-                        st.error("Kunne ikke slette prosessen")
+        # itertuples gir lette navngitte tupler i stedet for en pd.Series per rad
+        etiketter = {
+            row.id: f"{row.prosessnavn} - {row.avdeling} - {row.prioritet}"
+            for row in filtered_df[['id', 'prosessnavn', 'avdeling', 'prioritet']].itertuples(index=False)
+        }
+        valgt_id = st.selectbox("Velg prosess", list(etiketter), format_func=etiketter.__getitem__, key="valgt_prosess")
+        col1, col2, _ = st.columns([1, 1, 6])
+        with col1:
+            rediger = st.button("✏️ Rediger", help="Rediger valgt prosess")
+        with col2:
+            slett = st.button("🗑️ Slett", help="Slett valgt prosess")
+
+        if rediger:
+            # Find the index in the original dataframe
+            matches = df.index[df['id'] == valgt_id]
+            if len(matches) == 0:
+                # Process was added after this session loaded its data - fetch just that row
+                # (the other cached filter combinations stay valid)
+                rad = hent_prosess(valgt_id)
+                if rad is not None:
+                    # Nyeste først, som i last_data()
+                    df = st.session_state.df = _optimize_dtypes(
+                        pd.concat([_optimize_dtypes(_rows_to_frame([rad])), df], ignore_index=True)
+                    )
+                    matches = df.index[df['id'] == valgt_id]
+            if len(matches) == 0:
+                # Deleted by another session in the meantime
+                st.warning("Prosessen finnes ikke lenger i databasen.")
+            else:
+                st.session_state.rediger_index = matches[0]
+                st.rerun()
+        if slett:
+            if slett_prosess_from_supabase(valgt_id):
+                navn = filtered_df.loc[filtered_df['id'] == valgt_id, 'prosessnavn'].iloc[0]
+                st.success(f"Prosess '{navn}' er slettet!")
+                st.session_state.df = _optimize_dtypes(df[df['id'] != valgt_id].reset_index(drop=True))
+                st.rerun()
+            else:
+                st.error("Kunne ikke slette prosessen")
 
     else:
         st.info("Ingen prosesser matcher filterkriteriene.")
 
+# Max markers per scatter chart; larger registries are plotted from a fixed random sample
+SCATTER_MAKS_PUNKTER = 5000
+
+CORRELATION_COLUMNS = ['justert_score', 'gevinst_score', 'gjennomforbarhet_score', 'strategisk_score',
+                       'antall_prosesser', 'behandlingstid', 'kostnadsbesparelse', 'arslig_tidsbesparing']
+# Subset of CORRELATION_COLUMNS, so both come from the same numeric projection
+SUMMARY_COLUMNS = ['justert_score', 'kostnadsbesparelse', 'arslig_tidsbesparing', 'antall_prosesser', 'behandlingstid']
+
+def _df_fingerprint(df):
+    """Cache key over the full frame contents (Streamlit only samples rows of large frames)"""
+    return len(df), int(pd.util.hash_pandas_object(df, index=False).sum())
+
+def _top_k_positions(values, k):
+    """Positions of the k largest values, largest first, ties in original order (same rows as nlargest).
+    Uses a partial sort (O(N)) instead of sorting the whole column; NaN only fills up the tail"""
+    missing = np.isnan(values)
+    valid = np.flatnonzero(~missing)
+    values = values[valid]
+    if len(values) > k:
+        threshold = np.partition(values, len(values) - k)[len(values) - k]
+        above = np.flatnonzero(values > threshold)
+        at_threshold = np.flatnonzero(values == threshold)[:k - len(above)]
+        candidates = np.sort(np.concatenate([above, at_threshold]))
+    else:
+        candidates = np.arange(len(values))
+    order = candidates[np.argsort(-values[candidates], kind='stable')]
+    return np.concatenate([valid[order], np.flatnonzero(missing)[:k - len(order)]])
+
+def _correlation_matrix(df, columns):
+    """Pearson correlation via a single np.corrcoef call; falls back to DataFrame.corr when
+    there are missing values (pandas correlates pairwise-complete rows) or fewer than two rows"""
+    values = df[columns].to_numpy(dtype=np.float64)
+    if len(values) < 2 or np.isnan(values).any():
+        return df[columns].corr()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.corrcoef(values, rowvar=False)
+    # Exact 1.0 on the diagonal (constant columns stay NaN, like pandas)
+    diagonal = np.diag(corr).copy()
+    diagonal[np.isfinite(diagonal)] = 1.0
+    np.fill_diagonal(corr, diagonal)
+    return pd.DataFrame(corr, index=columns, columns=columns)
+
+def _koder_med_mangler(kategorisk):
+    """Category codes with missing values (-1) moved to an extra last group; returns (codes, ngroups)"""
+    codes = kategorisk.codes.to_numpy().astype(np.intp)
+    ngroups = len(kategorisk.categories) + 1
+    codes[codes < 0] = ngroups - 1
+    return codes, ngroups
+
+@st.cache_data(show_spinner=False, max_entries=4, hash_funcs={pd.DataFrame: _df_fingerprint})
+def beregn_visualiseringsdata(df):
+    """Aggregates behind the visualisation charts, computed once per version of the data"""
+    # One projection of the numeric columns, reused for the sums, correlation and summary
+    numerisk = df[CORRELATION_COLUMNS]
+    # One (avdeling, prioritet) count table and savings table from a single pass over the combined
+    # category codes (no GroupBy object); all three distributions are row/column sums of these.
+    # Missing values get their own last row/column, so they still count along the other axis
+    avdeling, prioritet = df['avdeling'].cat, df['prioritet'].cat
+    avd_codes, n_avd = _koder_med_mangler(avdeling)
+    pri_codes, n_pri = _koder_med_mangler(prioritet)
+    kombinert = avd_codes * n_pri + pri_codes
+    antall_tabell = np.bincount(kombinert, minlength=n_avd * n_pri).reshape(n_avd, n_pri)
+    kostnad_tabell = np.bincount(
+        kombinert, weights=np.nan_to_num(numerisk['kostnadsbesparelse'].to_numpy(dtype=np.float64)),
+        minlength=n_avd * n_pri
+    ).reshape(n_avd, n_pri)
+
+    # Like value_counts(): every category, most frequent first, ties in category order
+    prioritet_antall = antall_tabell[:, :-1].sum(axis=0)
+    prioritet_rekkefolge = np.argsort(-prioritet_antall, kind='stable')
+    prioritet_counts = pd.Series(
+        prioritet_antall[prioritet_rekkefolge],
+        index=pd.CategoricalIndex(prioritet.categories[prioritet_rekkefolge], dtype=df['prioritet'].dtype, name='prioritet'),
+        name='count'
+    )
+
+    antall = antall_tabell[:-1].sum(axis=1)
+    kostnad = kostnad_tabell[:-1].sum(axis=1)
+    if pd.api.types.is_integer_dtype(numerisk['kostnadsbesparelse']):
+        kostnad = kostnad.astype(np.int64)
+    observed = antall > 0
+    navn = avdeling.categories.to_numpy()[observed]
+    antall, kostnad = antall[observed], kostnad[observed]
+    # Largest first; stable so ties keep category order. Plain NumPy arrays go straight to px.bar,
+    # which Plotly sends as base64 typed arrays instead of JSON number lists
+    antall_rekkefolge = np.argsort(-antall, kind='stable')
+    kostnad_rekkefolge = np.argsort(-kostnad, kind='stable')
+    return {
+        'prioritet_counts': prioritet_counts,
+        'avd_counts': (navn[antall_rekkefolge], antall[antall_rekkefolge]),
+        'kostnader_avd': (navn[kostnad_rekkefolge], kostnad[kostnad_rekkefolge]),
+        'corr_df': _correlation_matrix(numerisk, CORRELATION_COLUMNS),
+        'summary_stats': numerisk[SUMMARY_COLUMNS].describe(),
+    }
+
+# Din tilpassede palett uten gult:
+DEPARTMENT_COLORS = (
+    "#8dd3c7", "#fb8072", "#80b1d3", "#bc80bd", "#bebada",
+    "#d9d9d9", "#fccde5", "#ccebc5", "#bcbd22", "#ff7f00",
+    "#a6cee3", "#1f78b4", "#b2df8a", "#33a02c", "#cab2d6",
+    "#6a3d9a"
+)  # Fjernet gule (#ffff99, #fdb462, #b3de69, #ffb3b3)
+
+@functools.lru_cache(maxsize=32)
+def _farge_kart(avdelinger):
+    return {dept: DEPARTMENT_COLORS[i % len(DEPARTMENT_COLORS)] for i, dept in enumerate(avdelinger)}
+
+def _avdeling_farger(df):
+    """Fast farge per avdeling, i rekkefølgen avdelingene dukker opp i df (delt mellom figurbyggerne)"""
+    return _farge_kart(tuple(df['avdeling'].unique()))
+
+def _scatter_utvalg(df):
+    """Scatterplottene får et utvalg når registeret blir stort, så nettleseren ikke må tegne alle punktene"""
+    if len(df) > SCATTER_MAKS_PUNKTER:
+        return df.sample(n=SCATTER_MAKS_PUNKTER, random_state=0)
+    return df
+
+# Figurene bygges én gang per dataversjon (versjon = _df_fingerprint) og gjenbrukes ved senere reruns.
+# Argumenter med understrek hashes ikke av Streamlit; de er bestemt av versjonsnøkkelen.
+# st.plotly_chart endrer ikke figuren, så samme objekt kan deles mellom økter
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _figurer_fordeling(versjon, _df):
+    """Prioritets- og avdelingsfordeling"""
+    import plotly.express as px
+
+    aggregater = beregn_visualiseringsdata(_df)
+    prioritet_counts = aggregater['prioritet_counts']
+    priority_colors = ["#F52727", "#F2F52B", '#4ECDC4', '#E8E8E8']
+    fig_pie = px.pie(
+        values=prioritet_counts.values, 
+        names=prioritet_counts.index,
+        title="Fordeling av prioritetskategorier",
+        color_discrete_sequence=priority_colors
+    )
+
+    avd_navn, avd_antall = aggregater['avd_counts']
+    fig_bar = px.bar(
+        x=avd_navn,
+        y=avd_antall,
+        title="Antall prosesser per avdeling",
+        labels={'x': 'Avdeling', 'y': 'Antall prosesser'},
+        color=avd_navn,
+        color_discrete_map=_avdeling_farger(_df)
+    )
+    return fig_pie, fig_bar
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _figurer_score(versjon, _df):
+    """Gevinst vs gjennomførbarhet og topp 10 prosesser"""
+    import plotly.express as px
+
+    dept_color_map = _avdeling_farger(_df)
+    # Scatter plot: Gevinst vs Gjennomførbarhet colored by department
+    fig_scatter = px.scatter(
+        _scatter_utvalg(_df), 
+        x='gjennomforbarhet_score', 
+        y='gevinst_score',
+        size='justert_score',
+        color='avdeling',  # Changed from 'prioritet' to 'avdeling'
+        hover_data=['prosessnavn', 'prioritet'],
+        title="Gevinst vs Gjennomførbarhet (farget etter avdeling)",
+        labels={'gjennomforbarhet_score': 'Gjennomførbarhet', 'gevinst_score': 'Gevinst'},
+        color_discrete_map=dept_color_map,
+        render_mode='webgl'
+    )
+    # Fast uirevision: zoom/pan beholdes og plottet slipper full re-layout ved rerun
+    fig_scatter.update_layout(uirevision='const')
+
+    # Top 10 prosesser etter score colored by department (fra samme data som resten av siden)
+    top_prosesser = _df.iloc[_top_k_positions(_df['justert_score'].to_numpy(dtype=np.float64), 10)][
+        ['prosessnavn', 'justert_score', 'prioritet', 'avdeling']]
+    fig_top = px.bar(
+        top_prosesser,
+        x='justert_score',
+        y='prosessnavn',
+        orientation='h',
+        color='avdeling',  # Changed from 'prioritet' to 'avdeling'
+        title="Topp 10 prosesser etter score (farget etter avdeling)",
+        color_discrete_map=dept_color_map
+    )
+    return fig_scatter, fig_top
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _figurer_okonomi(versjon, _df):
+    """Kostnadsbesparelse per avdeling og tidsbesparing vs kostnadsbesparelse"""
+    import plotly.express as px
+
+    dept_color_map = _avdeling_farger(_df)
+    # Kostnadsbesparelse per avdeling with consistent colors
+    kostnad_navn, kostnad_sum = beregn_visualiseringsdata(_df)['kostnader_avd']
+    fig_kostnad = px.bar(
+        x=kostnad_navn,
+        y=kostnad_sum,
+        title="Potensiell årlig kostnadsbesparelse per avdeling",
+        labels={'x': 'Avdeling', 'y': 'Kostnadsbesparelse (kr)'},
+        color=kostnad_navn,
+        color_discrete_map=dept_color_map
+    )
+
+    # Tidsbesparing vs Kostnadsbesparelse colored by department
+    fig_tid_kostnad = px.scatter(
+        _scatter_utvalg(_df),
+        x='arslig_tidsbesparing',
+        y='kostnadsbesparelse',
+        size='justert_score',
+        color='avdeling',  # Changed from 'prioritet' to 'avdeling'
+        hover_data=['prosessnavn', 'prioritet'],
+        title="Tidsbesparing vs Kostnadsbesparelse (farget etter avdeling)",
+        labels={'arslig_tidsbesparing': 'Årlig tidsbesparing (timer)', 'kostnadsbesparelse': 'Kostnadsbesparelse (kr)'},
+        color_discrete_map=dept_color_map,
+        render_mode='webgl'
+    )
+    fig_tid_kostnad.update_layout(uirevision='const')
+    return fig_kostnad, fig_tid_kostnad
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _figur_korrelasjon(versjon, _df):
+    """Korrelasjonsmatrise som heatmap, og sammendragsstatistikken som vises under den"""
+    import plotly.graph_objects as go
+
+    aggregater = beregn_visualiseringsdata(_df)
+    corr_df = aggregater['corr_df']
+    # Ett Heatmap-spor; tekst bare i celler med |r| > 0.3 i stedet for tekst i alle celler
+    z = corr_df.to_numpy()
+    tekst = np.where(np.abs(z) > 0.3, np.round(z, 2).astype(str), "")
+    fig_heatmap = go.Figure(go.Heatmap(
+        z=z.astype(np.float32),  # NumPy-arrays sendes som base64; float32 halverer størrelsen
+        x=corr_df.columns,
+        y=corr_df.index,
+        colorscale='RdBu',
+        zmid=0,
+        text=tekst,
+        texttemplate="%{text}"
+    ))
+    fig_heatmap.update_layout(title="Korrelasjonsmatrise")
+    fig_heatmap.update_yaxes(autorange='reversed')  # Samme radrekkefølge som px.imshow
+    return fig_heatmap, aggregater['summary_stats']
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def _csv_bytes(versjon, _df):
+    """CSV-eksport av df som bytes (versjon = _df_fingerprint er cachenøkkelen).
+    Samme format som før (DataFrame.to_csv); gevinsten ligger i cachingen og at den lages ved klikk"""
+    return _df.drop(columns=['_is_hoy'], errors='ignore').to_csv(index=False).encode('utf-8')
+
+@st.fragment
+def _vis_figurfaner(versjon, df, utvalg_tekst):
+    """Figurfanene som fragment: fanebytte kjører bare fanene på nytt, ikke resten av siden"""
+    # Fanene sporer valgt fane (on_change="rerun"), så bare den åpne fanen bygger figurene sine
+    fane_fordeling, fane_score, fane_okonomi, fane_detaljer = st.tabs(
+        ["Fordeling", "Score-analyse", "Økonomisk analyse", "Detaljert analyse"],
+        key="visualisering_fane", on_change="rerun"
+    )
+
+    if fane_fordeling.open:
+        with fane_fordeling:
+            fig_pie, fig_bar = _figurer_fordeling(versjon, df)
+            col1, col2 = st.columns(2)
+
+            with col1:
+                # Prioritetsfordeling
+                st.subheader("Prioritetsfordeling")
+                st.plotly_chart(fig_pie, use_container_width=True)
+
+            with col2:
+                # Avdelingsfordeling with department colors
+                st.subheader("Avdelingsfordeling")
+                st.plotly_chart(fig_bar, use_container_width=True)
+
+    if fane_score.open:
+        with fane_score:
+            fig_scatter, fig_top = _figurer_score(versjon, df)
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.plotly_chart(fig_scatter, use_container_width=True)
+
+            with col2:
+                st.subheader("Top 10 prosesser")
+                st.plotly_chart(fig_top, use_container_width=True)
+
+            if utvalg_tekst:
+                st.caption(utvalg_tekst)
+
+    if fane_okonomi.open:
+        with fane_okonomi:
+            fig_kostnad, fig_tid_kostnad = _figurer_okonomi(versjon, df)
+            col1, col2 = st.columns(2)
+
+            with col1:
+                st.plotly_chart(fig_kostnad, use_container_width=True)
+
+            with col2:
+                st.plotly_chart(fig_tid_kostnad, use_container_width=True)
+
+            if utvalg_tekst:
+                st.caption(utvalg_tekst)
+
+    if fane_detaljer.open:
+        with fane_detaljer:
+            # Korrelasjonsanalyse
+            fig_heatmap, summary_stats = _figur_korrelasjon(versjon, df)
+            st.plotly_chart(fig_heatmap, use_container_width=True)
+
+            # Sammendrag statistikk
+            st.subheader("Sammendrag statistikk")
+            st.dataframe(summary_stats)
+
 def vis_visualisering():
     """Viser visualiseringer og analyse"""
     st.subheader("📈 Visualisering og analyse")
@@ -1199,157 +1763,27 @@ def vis_visualisering():
         st.info("Ingen prosesser registrert ennå. Gå til hovedsiden for å registrere prosesser.")
         return
     
-    # Konverter numeriske kolonner
-    numeric_cols = ['justert_score', 'kostnadsbesparelse', 'arslig_tidsbesparing', 'antall_prosesser', 'behandlingstid']
-    for col in numeric_cols:
-        df[col] = pd.to_numeric(df[col], errors='coerce')
+    # Numeriske kolonner er allerede konvertert én gang ved innlasting (_optimize_dtypes)
+    # Plotly importeres først i figurbyggerne, så oppstart av appen slipper importkostnaden
+    versjon = _df_fingerprint(df)
+    utvalg_tekst = None
+    if len(df) > SCATTER_MAKS_PUNKTER:
+        utvalg_tekst = f"Spredningsplottene viser et tilfeldig utvalg på {SCATTER_MAKS_PUNKTER:,} av {len(df):,} prosesser."
     
-    # Create color palette for departments
-    unique_departments = df['avdeling'].unique()
-    # Din tilpassede palett uten gult:
-    department_colors = [
-        "#8dd3c7", "#fb8072", "#80b1d3", "#bc80bd", "#bebada",
-        "#d9d9d9", "#fccde5", "#ccebc5", "#bcbd22", "#ff7f00",
-        "#a6cee3", "#1f78b4", "#b2df8a", "#33a02c", "#cab2d6",
-        "#6a3d9a"
-    ]  # Fjernet gule (#ffff99, #fdb462, #b3de69, #ffb3b3)
-
-    dept_color_map = {dept: department_colors[i % len(department_colors)] for i, dept in enumerate(unique_departments)}
+    _vis_figurfaner(versjon, df, utvalg_tekst)
 
-    
-    # Visualiseringer
-    col1, col2 = st.columns(2)  
-    
-    with col1:
-        # Prioritetsfordeling
-        st.subheader("Prioritetsfordeling")
-        prioritet_counts = df['prioritet'].value_counts()
-        priority_colors = ["#F52727", "#F2F52B", '#4ECDC4', '#E8E8E8']
-        fig_pie = px.pie(
-            values=prioritet_counts.values, 
-            names=prioritet_counts.index,
-            title="Fordeling av prioritetskategorier",
-            color_discrete_sequence=priority_colors
-        )
-        st.plotly_chart(fig_pie, use_container_width=True)
-    
-    with col2:
-        # Avdelingsfordeling with department colors
-        st.subheader("Avdelingsfordeling")
-        avd_counts = df['avdeling'].value_counts()
-        fig_bar = px.bar(
-            x=avd_counts.index, 
-            y=avd_counts.values,
-            title="Antall prosesser per avdeling",
-            labels={'x': 'Avdeling', 'y': 'Antall prosesser'},
-            color=avd_counts.index,
-            color_discrete_map=dept_color_map
-        )
-        st.plotly_chart(fig_bar, use_container_width=True)
-    
-    # Score analyse
-    st.subheader("Score-analyse")
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        # Scatter plot: Gevinst vs Gjennomførbarhet colored by department
-        fig_scatter = px.scatter(
-            df, 
-            x='gjennomforbarhet_score', 
-            y='gevinst_score',
-            size='justert_score',
-            color='avdeling',  # Changed from 'prioritet' to 'avdeling'
-            hover_data=['prosessnavn', 'prioritet'],
-            title="Gevinst vs Gjennomførbarhet (farget etter avdeling)",
-            labels={'gjennomforbarhet_score': 'Gjennomførbarhet', 'gevinst_score': 'Gevinst'},
-            color_discrete_map=dept_color_map
-        )
-        st.plotly_chart(fig_scatter, use_container_width=True)
-    
-    with col2:
-        # Top 10 prosesser etter score colored by department
-        st.subheader("Top 10 prosesser")
-        top_prosesser = df.nlargest(10, 'justert_score')[['prosessnavn', 'justert_score', 'prioritet', 'avdeling']]
-        fig_top = px.bar(
-            top_prosesser,
-            x='justert_score',
-            y='prosessnavn',
-            orientation='h',
-            color='avdeling',  # Changed from 'prioritet' to 'avdeling'
-            title="Topp 10 prosesser etter score (farget etter avdeling)",
-            color_discrete_map=dept_color_map
-        )
-        st.plotly_chart(fig_top, use_container_width=True)
-    
-    # Økonomisk analyse
-    st.subheader("Økonomisk analyse")
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        # Kostnadsbesparelse per avdeling with consistent colors
-        kostnader_avd = df.groupby('avdeling')['kostnadsbesparelse'].sum().sort_values(ascending=False)
-        fig_kostnad = px.bar(
-            x=kostnader_avd.index,
-            y=kostnader_avd.values,
-            title="Potensiell årlig kostnadsbesparelse per avdeling",
-            labels={'x': 'Avdeling', 'y': 'Kostnadsbesparelse (kr)'},
-            color=kostnader_avd.index,
-            color_discrete_map=dept_color_map
-        )
-        st.plotly_chart(fig_kostnad, use_container_width=True)
-    
-    with col2:
-        # Tidsbesparing vs Kostnadsbesparelse colored by department
-        fig_tid_kostnad = px.scatter(
-            df,
-            x='arslig_tidsbesparing',
-            y='kostnadsbesparelse',
-            size='justert_score',
-            color='avdeling',  # Changed from 'prioritet' to 'avdeling'
-            hover_data=['prosessnavn', 'prioritet'],
-            title="Tidsbesparing vs Kostnadsbesparelse (farget etter avdeling)",
-            labels={'arslig_tidsbesparing': 'Årlig tidsbesparing (timer)', 'kostnadsbesparelse': 'Kostnadsbesparelse (kr)'},
-            color_discrete_map=dept_color_map
-        )
-        st.plotly_chart(fig_tid_kostnad, use_container_width=True)
-    
-    # Detaljert analyse
-    st.subheader("Detaljert analyse")
-    
-    # Korrelasjonsanalyse
-    correlation_cols = ['justert_score', 'gevinst_score', 'gjennomforbarhet_score', 'strategisk_score', 
-                       'antall_prosesser', 'behandlingstid', 'kostnadsbesparelse', 'arslig_tidsbesparing']
-    
-    corr_df = df[correlation_cols].corr()
-    
-    fig_heatmap = px.imshow(
-        corr_df,
-        text_auto=True,
-        aspect="auto",
-        title="Korrelasjonsmatrise",
-        color_continuous_scale='RdBu'
-    )
-    st.plotly_chart(fig_heatmap, use_container_width=True)
-    
-    # Sammendrag statistikk
-    st.subheader("Sammendrag statistikk")
-    
-    summary_stats = df[['justert_score', 'kostnadsbesparelse', 'arslig_tidsbesparing', 'antall_prosesser', 'behandlingstid']].describe()
-    st.dataframe(summary_stats)
-    
     # Eksport funksjonalitet
     st.subheader("Eksport data")
     col1 = st.columns(1)[0]
     
     with col1:
-        if st.button("📥 Last ned CSV"):
-            csv = df.to_csv(index=False, encoding='utf-8')
-            st.download_button(
-                label="Last ned prosessdata som CSV",
-                data=csv,
-                file_name=f"rpa_prosesser_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                mime="text/csv"
-            )
+        # CSV-en lages først når brukeren klikker (data som callable), og bare én gang per dataversjon
+        st.download_button(
+            label="📥 Last ned prosessdata som CSV",
+            data=lambda: _csv_bytes(versjon, df),
+            file_name=f"rpa_prosesser_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+            mime="text/csv"
+        )
 
 # Kjør app
 if __name__ == "__main__":